@@ -0,0 +1,29 @@
+import pytest
+from jose import jwt
+
+from src.auth import (ALGORITHM, BCRYPT_ROUNDS, SECRET_KEY,
+                      create_access_token, password_context)
+
+CLAIMS = {"sub": "user1", "role": "MEMBER"}
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_create_access_token(benchmark):
+    benchmark(create_access_token, CLAIMS)
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_decode_access_token(benchmark):
+    token = create_access_token(CLAIMS)
+    payload = benchmark(jwt.decode, token, SECRET_KEY, algorithms=[ALGORITHM])
+    assert payload["sub"] == "user1"
+
+
+@pytest.mark.benchmark(group="bcrypt")
+def bench_bcrypt_verify(benchmark):
+    # A single verify takes ~0.25s at cost 12, so keep the round count small
+    hashed = password_context.hash("benchmark1234")
+    benchmark.extra_info["rounds"] = BCRYPT_ROUNDS
+    assert benchmark.pedantic(
+        password_context.verify, ("benchmark1234", hashed), rounds=5, iterations=1
+    )
@@ -0,0 +1,240 @@
+import inspect
+import itertools
+import os
+
+import pytest
+from bson import ObjectId
+
+from benchmarks.data import DEEP_PAGE, PAGE_SIZE, STORAGE, loan_document
+from benchmarks.storage import empty_database, seed
+from src.crud import (book, catalog, loan, loan_renewal, loan_return,
+                      loan_summary, stats, user)
+from src.models.book import BookCreate, BookUpdate
+from src.models.loan import LoanCreate, LoanStatus, LoanUpdate
+from src.models.loan_renewal import LoanRenewalCreate
+from src.models.loan_return import LibrarianStatus, LoanReturnCreate
+from src.models.user import UserCreate, UserUpdate
+
+MODULES = [book, catalog, user, loan, loan_return, loan_renewal, loan_summary, stats]
+# mongomock-motor can't run these, they are reported as skipped
+UNSUPPORTED = {
+    "book.search_book_ranked": "mongomock has no $text search",
+    "loan.renew_loan": "mongomock can't $add to a date in an update pipeline",
+}
+if STORAGE == "memory":
+    UNSUPPORTED = {}
+
+
+def _id(data, collection, i=0):
+    return str(data[collection][i]["_id"])
+
+
+def _new_book(i):
+    return {"title": f"Imported {i}", "author": "Benchmark", "category": "Import"}
+
+
+# Inserted titles, usernames and loan ids must differ between rounds, since the
+# memory storage enforces the unique indexes
+_serial = itertools.count()
+
+
+# "<module>.<function>" -> (dataset -> (args, kwargs)), db is inserted by name
+CASES = {
+    "book.get_book_by_id": lambda d: ([_id(d, "books")], {}),
+    "book.get_book_by_title": lambda d: (["Book 7"], {}),
+    "book.get_books_by_ids": lambda d: (
+        [[_id(d, "books", i) for i in range(20)]],
+        {},
+    ),
+    "book.search_book": lambda d: ([0, 50], {"title": "Book 1"}),
+    "book.search_book_ranked": lambda d: (["book author", 0, 50], {}),
+    "book.check_book_uniqueness": lambda d: (["Book 7", "Author 7"], {}),
+    "book.get_books": lambda d: ([0, 50], {}),
+    "book.create_book": lambda d: (
+        [BookCreate(title=f"New {next(_serial)}", author="Benchmark", category="New")],
+        {},
+    ),
+    "book.insert_books": lambda d: (
+        [[_new_book(next(_serial)) for _ in range(50)]],
+        {},
+    ),
+    "book.update_book": lambda d: ([_id(d, "books"), BookUpdate(category="X")], {}),
+    "book.checkout_book": lambda d: (["Book 7"], {}),
+    "book.checkin_book": lambda d: (["Book 7"], {}),
+    "book.delete_book": lambda d: ([_id(d, "books")], {}),
+    "catalog.get_catalog_version": lambda d: ([], {}),
+    "catalog.bump_catalog_version": lambda d: ([], {}),
+    "user.check_username_exists": lambda d: (["user7"], {}),
+    "user.create_user": lambda d: (
+        [
+            UserCreate(
+                username=f"new{next(_serial)}", password="benchmark1234", role="MEMBER"
+            ),
+            "not-a-hash",
+        ],
+        {},
+    ),
+    "user.get_user_by_username": lambda d: (["user7"], {}),
+    "user.get_cached_user_by_username": lambda d: (["user7"], {}),
+    "user.get_user_by_id": lambda d: ([_id(d, "users")], {}),
+    "user.get_users_by_ids": lambda d: (
+        [[_id(d, "users", i) for i in range(20)]],
+        {},
+    ),
+    "user.get_users": lambda d: ([0, 50], {}),
+    "user.update_user": lambda d: ([_id(d, "users"), UserUpdate(full_name="X")], {}),
+    "user.update_user_password": lambda d: (["user7", "not-a-hash"], {}),
+    "user.delete_user": lambda d: (["user7"], {}),
+    "loan.create_loan": lambda d: (
+        [LoanCreate(username="user7", book_title="Book 7", status="PENDING")],
+        {},
+    ),
+    "loan.get_loan": lambda d: ([_id(d, "loans")], {}),
+    "loan.get_loans_by_ids": lambda d: (
+        [[_id(d, "loans", i) for i in range(20)]],
+        {},
+    ),
+    "loan.get_loans": lambda d: ([0, 50], {"status": LoanStatus.APPROVED}),
+    "loan.get_user_loans": lambda d: (["user7"], {"limit": 50}),
+    "loan.get_book_loans": lambda d: (["Book 7", 0, 50], {}),
+    "loan.existing_loan": lambda d: (["user7", "Book 7"], {}),
+    "loan.update_loan": lambda d: (
+        [_id(d, "loans"), LoanUpdate(status=LoanStatus.APPROVED)],
+        {},
+    ),
+    "loan.approve_loan": lambda d: ([_id(d, "loans", 0)], {}),
+    "loan.return_loan": lambda d: ([_id(d, "loans", 1)], {}),
+    "loan.request_loan_renewal": lambda d: ([_id(d, "loans", 1), "user1"], {}),
+    "loan.renew_loan": lambda d: ([_id(d, "loans", 1)], {}),
+    "loan.delete_loan": lambda d: ([_id(d, "loans")], {}),
+    "loan_return.create_loan_return": lambda d: (
+        [LoanReturnCreate(loan_id=_id(d, "loans")), LibrarianStatus.PENDING],
+        {},
+    ),
+    "loan_return.get_loan_return": lambda d: ([_id(d, "loan_returns")], {}),
+    "loan_return.get_loan_returns": lambda d: (
+        [0, 50],
+        {"status": LibrarianStatus.PENDING},
+    ),
+    "loan_return.get_loan_id_returns": lambda d: ([_id(d, "loans"), 0, 50], {}),
+    "loan_return.existing_loan_return": lambda d: ([_id(d, "loans")], {}),
+    "loan_return.update_loan_return": lambda d: (
+        [_id(d, "loan_returns"), LibrarianStatus.APPROVED],
+        {},
+    ),
+    "loan_return.approve_loan_return": lambda d: ([_id(d, "loan_returns")], {}),
+    "loan_return.delete_loan_return": lambda d: ([_id(d, "loan_returns")], {}),
+    "loan_renewal.create_loan_renewal": lambda d: (
+        [LoanRenewalCreate(loan_id=str(ObjectId())), LibrarianStatus.PENDING],
+        {},
+    ),
+    "loan_renewal.get_loan_renewal": lambda d: ([_id(d, "loan_renewals")], {}),
+    "loan_renewal.get_loan_renewals": lambda d: (
+        [0, 50],
+        {"status": LibrarianStatus.PENDING},
+    ),
+    "loan_renewal.get_loan_id_renewals": lambda d: ([_id(d, "loans"), 0, 50], {}),
+    "loan_renewal.existing_loan_renewal": lambda d: ([_id(d, "loans")], {}),
+    "loan_renewal.update_loan_renewal": lambda d: (
+        [_id(d, "loan_renewals"), LibrarianStatus.APPROVED],
+        {},
+    ),
+    "loan_renewal.approve_loan_renewal": lambda d: ([_id(d, "loan_renewals")], {}),
+    "loan_renewal.delete_loan_renewal": lambda d: ([_id(d, "loan_renewals")], {}),
+    "loan_summary.rebuild_loan_summary": lambda d: (["user7"], {}),
+    "loan_summary.get_loan_summary": lambda d: (["user7"], {}),
+    "loan_summary.add_summary_loan": lambda d: ([d["loans"][7]], {}),
+    "loan_summary.set_summary_loan": lambda d: (
+        ["user7", _id(d, "loans", 7), {"status": "APPROVED"}],
+        {},
+    ),
+    "loan_summary.remove_summary_loan": lambda d: (
+        ["user7", _id(d, "loans", 7), "Book 7"],
+        {},
+    ),
+    "stats.compute_circulation_stats": lambda d: ([], {}),
+    "stats.get_circulation_stats": lambda d: ([], {}),
+}
+
+# Write paths that expect the summary document to exist already
+NEEDS_SUMMARY = {
+    "loan_summary.add_summary_loan",
+    "loan_summary.set_summary_loan",
+    "loan_summary.remove_summary_loan",
+}
+
+
+def crud_functions():
+    for module in MODULES:
+        prefix = module.__name__.rsplit(".", 1)[1]
+        for name, function in inspect.getmembers(module, inspect.iscoroutinefunction):
+            if name.startswith("_") or function.__module__ != module.__name__:
+                continue
+            yield f"{prefix}.{name}", function
+
+
+def crud_params():
+    for name, function in crud_functions():
+        if name in UNSUPPORTED:
+            reason = UNSUPPORTED[name]
+        elif name not in CASES:
+            reason = "no benchmark case, add one to CASES"
+        else:
+            yield pytest.param(function, CASES[name], id=name)
+            continue
+        yield pytest.param(None, None, id=name, marks=pytest.mark.skip(reason=reason))
+
+
+@pytest.mark.parametrize("function, case", list(crud_params()))
+@pytest.mark.benchmark(group="crud")
+def bench_crud(run, db, dataset, event_loop, request, function, case):
+    if request.node.callspec.id in NEEDS_SUMMARY:
+        event_loop.run_until_complete(loan_summary.rebuild_loan_summary("user7", db))
+
+    # The arguments are rebuilt every round, so inserts never reuse an _id
+    position = list(inspect.signature(function).parameters).index("db")
+
+    def call():
+        args, kwargs = case(dataset)
+        return function(*args[:position], db, *args[position:], **kwargs)
+
+    run(call)
+
+
+@pytest.fixture(scope="module")
+def paged_loans(event_loop, mongo_client):
+    # Enough loans for DEEP_PAGE full pages, seeded once; the page reads don't write
+    loans = [loan_document(i) for i in range((DEEP_PAGE + 1) * PAGE_SIZE)]
+
+    async def create():
+        database = await empty_database(
+            mongo_client, os.environ["MONGO_DB_NAME"] + "_pages"
+        )
+        await seed(database, "loans", loans)
+        return database
+
+    return event_loop.run_until_complete(create()), loans
+
+
+# page -> (skip, after) for get_loans; the cursor is the _id ending the page before
+PAGES = {
+    "skip_page_1": lambda loans: (0, None),
+    "skip_page_deep": lambda loans: ((DEEP_PAGE - 1) * PAGE_SIZE, None),
+    "cursor_page_1": lambda loans: (0, None),
+    "cursor_page_deep": lambda loans: (
+        0,
+        loans[(DEEP_PAGE - 1) * PAGE_SIZE - 1]["_id"],
+    ),
+}
+
+
+@pytest.mark.parametrize("page", PAGES)
+@pytest.mark.benchmark(group="pagination")
+def bench_get_loans_page(run, paged_loans, page):
+    database, loans = paged_loans
+    skip, after = PAGES[page](loans)
+    result = run(loan.get_loans, database, skip, PAGE_SIZE, after=after)
+    first = (DEEP_PAGE - 1) * PAGE_SIZE if page.endswith("deep") else 0
+    assert [d["_id"] for d in result] == [
+        d["_id"] for d in loans[first:first + PAGE_SIZE]
+    ]
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+from pydantic import TypeAdapter
+
+from benchmarks.data import (PAYLOAD_SIZE, book_document, loan_document,
+                             request_document, user_document)
+from src.models.book import BookResponse
+from src.models.loan import LoanResponse
+from src.models.loan_renewal import LoanRenewalResponse
+from src.models.loan_return import LoanReturnResponse
+from src.models.user import UserResponse
+from src.serialization import ListSerializer
+
+_loans = [loan_document(i) for i in range(PAYLOAD_SIZE)]
+
+# One list response model per module in src/models; stats has no list response
+PAYLOADS = {
+    "book": (BookResponse, [book_document(i) for i in range(PAYLOAD_SIZE)]),
+    "user": (UserResponse, [user_document(i) for i in range(PAYLOAD_SIZE)]),
+    "loan": (LoanResponse, _loans),
+    "loan_return": (
+        LoanReturnResponse,
+        [request_document(i, _loans) for i in range(PAYLOAD_SIZE)],
+    ),
+    "loan_renewal": (
+        LoanRenewalResponse,
+        [request_document(i, _loans) for i in range(PAYLOAD_SIZE)],
+    ),
+}
+
+
+@pytest.mark.parametrize("name", PAYLOADS)
+@pytest.mark.benchmark(group="models")
+def bench_validate(benchmark, name):
+    model, documents = PAYLOADS[name]
+    adapter = TypeAdapter(list[model])
+    items = benchmark(adapter.validate_python, documents)
+    assert len(items) == PAYLOAD_SIZE
+
+
+@pytest.mark.parametrize("name", PAYLOADS)
+@pytest.mark.benchmark(group="models")
+def bench_validate_and_dump(benchmark, name):
+    # What FastAPI does for a response_model list: validate, dump, encode
+    model, documents = PAYLOADS[name]
+    adapter = TypeAdapter(list[model])
+
+    def render():
+        items = adapter.validate_python(documents)
+        return json.dumps(adapter.dump_python(items, mode="json", by_alias=True))
+
+    benchmark(render)
+
+
+@pytest.mark.parametrize("trusted", [True, False], ids=["trusted", "validated"])
+@pytest.mark.parametrize("name", PAYLOADS)
+@pytest.mark.benchmark(group="models")
+def bench_list_serializer(benchmark, name, trusted):
+    model, documents = PAYLOADS[name]
+    serializer = ListSerializer(model, trusted=trusted)
+    benchmark(serializer.dump, documents)
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from benchmarks.data import SEARCH_BOOKS, STORAGE, book_document
+from benchmarks.storage import empty_database, seed
+from src.crud.book import search_book, search_book_ranked
+
+# What a user types, and the regex filter the same input becomes on the old path
+QUERIES = {
+    "title": ("Book 4242", {"title": "Book 4242"}),
+    "author": ("Author 7", {"author": "Author 7"}),
+}
+
+pytestmark = pytest.mark.skipif(
+    STORAGE == "mongomock", reason="mongomock has no $text search"
+)
+
+
+@pytest.fixture(scope="module", params=SEARCH_BOOKS, ids=lambda n: f"{n}_books")
+def books_db(request, event_loop, mongo_client):
+    # Seeded once per size, the searches don't write
+    async def create():
+        database = await empty_database(
+            mongo_client, os.environ["MONGO_DB_NAME"] + "_search"
+        )
+        await seed(database, "books", [book_document(i) for i in range(request.param)])
+        return database
+
+    return event_loop.run_until_complete(create())
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.benchmark(group="search")
+def bench_search_regex(run, books_db, query):
+    _, filters = QUERIES[query]
+    run(search_book, books_db, 0, 50, **filters)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.benchmark(group="search")
+def bench_search_ranked(run, books_db, query):
+    text, _ = QUERIES[query]
+    run(search_book_ranked, books_db, text, 0, 50)
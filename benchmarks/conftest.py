@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("MONGO_DB_NAME", "library_benchmark")
+os.environ.setdefault("ADMIN_USERNAME", "admin")
+os.environ.setdefault("ADMIN_PASSWORD", "admin1234")
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from benchmarks.data import (BOOKS, LOANS, MONGO_URI, STORAGE,  # noqa: E402
+                             USERS, book_document, loan_document,
+                             request_document, user_document)
+from benchmarks.storage import empty_database, seed  # noqa: E402
+from src.cache import TTLCache  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def mongo_client(event_loop):
+    # BENCHMARK_STORAGE=mongo only: one client and connection pool for the run
+    if STORAGE != "mongo":
+        yield None
+        return
+    client = AsyncIOMotorClient(MONGO_URI)
+    yield client
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    loans = [loan_document(i) for i in range(LOANS)]
+    return {
+        "books": [book_document(i) for i in range(BOOKS)],
+        "users": [user_document(i) for i in range(USERS)],
+        "loans": loans,
+        "loan_returns": [request_document(i, loans) for i in range(LOANS // 4)],
+        "loan_renewals": [request_document(i, loans) for i in range(LOANS // 4)],
+    }
+
+
+@pytest.fixture
+def db(event_loop, mongo_client, dataset, monkeypatch):
+    async def create():
+        database = await empty_database(mongo_client)
+        for name, documents in dataset.items():
+            await seed(database, name, documents)
+        return database
+
+    database = event_loop.run_until_complete(create())
+
+    # Benchmarks measure the database path, the process caches are switched off
+    for module, name in [
+        ("src.crud.book", "book_cache"),
+        ("src.crud.book", "book_title_cache"),
+        ("src.crud.catalog", "catalog_version_cache"),
+        ("src.crud.user", "user_cache"),
+        ("src.crud.stats", "stats_cache"),
+    ]:
+        monkeypatch.setattr(f"{module}.{name}", TTLCache(1, 0, False))
+
+    return database
+
+
+@pytest.fixture
+def run(benchmark, event_loop):
+    # benchmark() needs a plain callable; each round runs one coroutine to the end
+    def run(factory, *args, **kwargs):
+        return benchmark(
+            lambda: event_loop.run_until_complete(factory(*args, **kwargs))
+        )
+
+    return run
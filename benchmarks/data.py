@@ -0,0 +1,66 @@
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# "mongomock" (mongomock-motor), "memory" (src.storage.memory) or "mongo", a real
+# server at BENCHMARK_MONGO_URI whose MONGO_DB_NAME database is dropped per benchmark
+STORAGE = os.environ.get("BENCHMARK_STORAGE", "mongomock")
+MONGO_URI = os.environ.get("BENCHMARK_MONGO_URI", "mongodb://localhost:27017")
+BOOKS = int(os.environ.get("BENCHMARK_BOOKS", "500"))
+USERS = int(os.environ.get("BENCHMARK_USERS", "200"))
+LOANS = int(os.environ.get("BENCHMARK_LOANS", "1000"))
+# Collection sizes for the text search against regex search comparison
+SEARCH_BOOKS = [
+    int(n)
+    for n in os.environ.get("BENCHMARK_SEARCH_BOOKS", "100000,1000000").split(",")
+]
+# Page compared with the first one in the pagination benchmarks, and its size
+DEEP_PAGE = int(os.environ.get("BENCHMARK_DEEP_PAGE", "1000"))
+PAGE_SIZE = int(os.environ.get("BENCHMARK_PAGE_SIZE", "20"))
+# Documents per list payload in the model benchmarks
+PAYLOAD_SIZE = int(os.environ.get("BENCHMARK_PAYLOAD_SIZE", "100"))
+
+
+def book_document(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "title": f"Book {i}",
+        "author": f"Author {i % 50}",
+        "category": f"Category {i % 10}",
+        "total_count": 5,
+        "available_count": 3,
+    }
+
+
+def user_document(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "username": f"user{i}",
+        "role": "MEMBER",
+        "full_name": f"User {i}",
+        "password": "not-a-hash",
+        "created_at": datetime(2024, 1, 1),
+    }
+
+
+def loan_document(i: int) -> dict:
+    date = datetime(2024, 1, 1) + timedelta(hours=i)
+    return {
+        "_id": ObjectId(),
+        "username": f"user{i % USERS}",
+        "book_title": f"Book {i % BOOKS}",
+        "status": ("PENDING", "APPROVED", "RETURNED", "RENEW_PENDING")[i % 4],
+        "date": date,
+        "return_date": date + timedelta(days=14),
+        "overdue": False,
+    }
+
+
+def request_document(i: int, loans: list) -> dict:
+    return {
+        "_id": ObjectId(),
+        "loan_id": str(loans[i % len(loans)]["_id"]),
+        "status": ("PENDING", "APPROVED")[i % 2],
+        "date": datetime(2024, 1, 1) + timedelta(hours=i),
+    }
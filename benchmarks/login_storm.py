@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("MONGO_DB_NAME", "library_benchmark")
+os.environ.setdefault("ADMIN_USERNAME", "admin")
+os.environ.setdefault("ADMIN_PASSWORD", "admin1234")
+os.environ.setdefault("OVERDUE_SWEEP_INTERVAL", "0")
+
+import httpx  # noqa: E402
+
+
+def percentile(samples: list, percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def poll_list(client, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        started_at = time.perf_counter()
+        response = await client.get("/book/list", params={"limit": 50})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started_at)
+
+
+def admin_form() -> dict:
+    return {
+        "username": os.environ["ADMIN_USERNAME"],
+        "password": os.environ["ADMIN_PASSWORD"],
+    }
+
+
+async def log_in(client, deadline: float, logins: list):
+    while time.perf_counter() < deadline:
+        response = await client.post("/token", data=admin_form())
+        response.raise_for_status()
+        logins.append(1)
+
+
+async def phase(client, pollers: int, loggers: int, seconds: float) -> dict:
+    latencies, logins = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(poll_list(client, deadline, latencies) for _ in range(pollers)),
+        *(log_in(client, deadline, logins) for _ in range(loggers)),
+    )
+    return {
+        "requests": len(latencies),
+        "logins": len(logins),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+async def storm(client, args):
+    quiet = await phase(client, args.pollers, 0, args.seconds)
+    print(f"/book/list alone:               {quiet}")
+    loud = await phase(client, args.pollers, args.logins, args.seconds)
+    print(f"/book/list during /token storm: {loud}")
+
+
+async def in_process(args):
+    # The app on the in-memory backend, driven without a network in between
+    os.environ.setdefault("STORAGE_BACKEND", "memory")
+    import main
+    from src.auth import password_hasher
+
+    if args.inline_bcrypt:
+        # What logins cost before bcrypt moved off the event loop
+        async def inline(fn, *fn_args):
+            return fn(*fn_args)
+
+        password_hasher.run = inline
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            response = await client.post("/token", data=admin_form())
+            token = response.json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            for i in range(args.books):
+                await client.post(
+                    "/book/",
+                    json={"title": f"Book {i}", "author": "Storm", "category": "X"},
+                    headers=headers,
+                )
+            await storm(client, args)
+
+
+async def against_server(args):
+    # A running deployment; the admin credentials above must be valid there
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        await storm(client, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report /book/list latency with and without a /token login storm"
+    )
+    parser.add_argument("--url", help="a running server, default: the app in process")
+    parser.add_argument("--pollers", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--books", type=int, default=100)
+    parser.add_argument(
+        "--inline-bcrypt",
+        action="store_true",
+        help="in process only: run bcrypt on the event loop, as before",
+    )
+    args = parser.parse_args()
+    asyncio.run(against_server(args) if args.url else in_process(args))
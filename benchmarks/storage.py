@@ -0,0 +1,28 @@
+import os
+
+from mongomock_motor import AsyncMongoMockClient
+
+from benchmarks.data import STORAGE
+from src.indexes import ensure_indexes
+from src.storage.memory import MemoryClient
+
+
+async def empty_database(mongo_client, name: str = os.environ["MONGO_DB_NAME"]):
+    # A fresh database, so writes never leak into the next benchmark; on a real
+    # server it lives on the session's client (the mongo_client fixture)
+    if STORAGE == "mongo":
+        database = mongo_client[name]
+        await mongo_client.drop_database(name)
+    elif STORAGE == "memory":
+        database = MemoryClient()[name]
+    else:
+        return AsyncMongoMockClient()[name]
+    await ensure_indexes(database)
+    return database
+
+
+async def seed(database, name: str, documents, chunk: int = 10000):
+    for start in range(0, len(documents), chunk):
+        await database[name].insert_many(
+            [dict(d) for d in documents[start:start + chunk]]
+        )
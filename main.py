@@ -1,30 +1,65 @@
+import asyncio
+import contextlib
+
 from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 
-from src.auth import Token, authenticate_user, create_access_token, ensure_admin_user
+from src.admission import ADMISSION_ENABLED, AdmissionMiddleware
+from src.auth import (Token, authenticate_user, create_access_token,
+                      password_hasher)
+from src.crud.catalog import catalog_changes
 from src.database import close_mongo_connection, connect_to_mongo, get_database
+from src.metrics import METRICS_ENABLED, MetricsMiddleware, metrics_response
+from src.overdue import OVERDUE_SWEEP_INTERVAL, run_overdue_sweeper
+from src.routes.admin import router as admin_router
 from src.routes.book import router as book_router
 from src.routes.loan import router as loan_router
 from src.routes.loan_renewal import router as loan_renewal_router
 from src.routes.loan_return import router as loan_return_router
+from src.routes.stats import router as stats_router
 from src.routes.user import router as user_router
+from src.slow_queries import (SLOW_QUERY_ENABLED, RouteContextMiddleware,
+                              slow_query_recorder)
+from src.startup import run_startup, timed
 
 
 async def lifespan(app: FastAPI):
-    await connect_to_mongo()
+    with timed("connect"):
+        await connect_to_mongo()
     db = await get_database()
-    await ensure_admin_user(db)
+    await run_startup(db)
+    if SLOW_QUERY_ENABLED:
+        slow_query_recorder.start(db)
+
+    sweeper = None
+    if OVERDUE_SWEEP_INTERVAL > 0:
+        sweeper = asyncio.create_task(run_overdue_sweeper(db, OVERDUE_SWEEP_INTERVAL))
     yield
+    if sweeper:
+        sweeper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await sweeper
+    await catalog_changes.flush()
     await close_mongo_connection()
+    password_hasher.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
+# Added first so the metrics middleware also sees the requests it sheds
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if SLOW_QUERY_ENABLED:
+    app.add_middleware(RouteContextMiddleware)
 
 app.include_router(book_router)
 app.include_router(user_router)
 app.include_router(loan_router)
 app.include_router(loan_return_router)
 app.include_router(loan_renewal_router)
+app.include_router(admin_router)
+app.include_router(stats_router)
 
 
 @app.get("/")
@@ -32,6 +67,13 @@ def home():
     return "The system is healthy and running!"
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return metrics_response()
+
+
 @app.post("/token", response_model=Token, tags=["Authentication"])
 async def login(
     login_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_database)
@@ -0,0 +1,226 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+
+from src.auth import ALGORITHM, SECRET_KEY
+from src.cache import TTLCache
+from src.metrics import admission_shed
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "false").lower() == "true"
+# Token bucket per user (the token's sub) or client IP, 0 turns rate limiting off
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "10"))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "20"))
+# Least recently seen keys are dropped past this, they start again with a full bucket
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "10000"))
+# Requests handled at once per route class, 0 means no limit
+ADMISSION_CONCURRENCY = {
+    "auth": int(os.environ.get("ADMISSION_AUTH_CONCURRENCY", "8")),
+    "search": int(os.environ.get("ADMISSION_SEARCH_CONCURRENCY", "32")),
+    "write": int(os.environ.get("ADMISSION_WRITE_CONCURRENCY", "32")),
+    "read": int(os.environ.get("ADMISSION_READ_CONCURRENCY", "0")),
+}
+# Requests waiting for a slot per route class, and how long each may wait
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "1"))
+
+# Health checks and scrapes are never shed
+EXEMPT_PATHS = {"/", "/metrics"}
+# A token is only decoded once a minute; an expired one still names its user
+TOKEN_CACHE_TTL = 60
+
+
+def route_class(method: str, path: str) -> str:
+    if path == "/token":
+        return "auth"
+    if method in ("GET", "HEAD"):
+        return "search" if path.endswith(("/search", "/list")) else "read"
+    # Batch lookups are reads sent as POST
+    if path.endswith("/batch"):
+        return "read"
+    return "write"
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (tokens, refilled at)
+        self.buckets = OrderedDict()
+
+    def take(self, key) -> float:
+        # Returns 0 if the request may go ahead, otherwise the seconds to wait
+        now = time.monotonic()
+        tokens, refilled_at = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - refilled_at) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+
+        self.buckets[key] = (tokens, now)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimit:
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiters = deque()
+
+    async def acquire(self) -> str:
+        # Returns "" once a slot is held, otherwise why the request was shed
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return ""
+        if len(self.waiters) >= self.queue_size:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+            return ""
+        except asyncio.TimeoutError:
+            # release() may have handed over the slot as the timeout fired
+            if waiter.done() and not waiter.cancelled():
+                return ""
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def release(self):
+        # The slot goes straight to the oldest waiter, so active stays the same
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_PER_SECOND,
+        burst: float = RATE_LIMIT_BURST,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
+        concurrency: dict = ADMISSION_CONCURRENCY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.buckets = TokenBuckets(rate, burst, max_keys) if rate > 0 else None
+        self.limits = {
+            name: ConcurrencyLimit(limit, queue_size, queue_timeout)
+            for name, limit in concurrency.items()
+            if limit > 0
+        }
+        self.token_subjects = TTLCache(max_keys, TOKEN_CACHE_TTL)
+        self.shed = {}
+
+    def client_key(self, scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                subject = self.token_subject(value.decode("latin-1"))
+                if subject:
+                    return "user:" + subject
+                break
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    def token_subject(self, authorization: str):
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        subject = self.token_subjects.get(token)
+        if subject is None:
+            # Only a verified sub gets its own bucket, forged tokens count as the IP
+            try:
+                claims = jwt.decode(
+                    token,
+                    SECRET_KEY,
+                    algorithms=[ALGORITHM],
+                    options={"verify_exp": False},
+                )
+            except JWTError:
+                return None
+            subject = claims.get("sub") or ""
+            self.token_subjects.set(token, subject)
+        return subject
+
+    def record_shed(self, route: str, reason: str):
+        admission_shed.labels(route, reason).inc()
+        key = f"{route}.{reason}"
+        self.shed[key] = self.shed.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "tracked_keys": len(self.buckets.buckets) if self.buckets else 0,
+            "active": {name: limit.active for name, limit in self.limits.items()},
+            "queued": {name: len(limit.waiters) for name, limit in self.limits.items()},
+            "shed": dict(self.shed),
+        }
+
+
+admission_controller = AdmissionController()
+
+
+async def _reject(scope, receive, send, status_code: int, detail: str, wait: float):
+    response = JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+    await response(scope, receive, send)
+
+
+class AdmissionMiddleware:
+    # Runs before routing, a shed request never reaches the database
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller
+        route = route_class(scope["method"], scope["path"])
+
+        if controller.buckets:
+            wait = controller.buckets.take(controller.client_key(scope))
+            if wait:
+                controller.record_shed(route, "rate_limited")
+                await _reject(scope, receive, send, 429, "Too many requests", wait)
+                return
+
+        limit = controller.limits.get(route)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await limit.acquire()
+        if reason:
+            controller.record_shed(route, reason)
+            await _reject(scope, receive, send, 503, "Server is busy", limit.timeout)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
@@ -1,4 +1,7 @@
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
@@ -8,13 +11,28 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, Field
 
-from src.crud.user import get_user_by_username
+from src.crud.user import (get_cached_user_by_username, get_user_by_username,
+                           update_user_password)
 from src.database import get_database
 from src.models.user import Role, UserBase
 
 SECRET_KEY = os.environ["SECRET_KEY"]
 ALGORITHM = "HS256"
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# "database" loads the user on every request, "claims" trusts the token's
+# sub/role and only checks them against a short-lived user cache
+AUTH_MODE = os.environ.get("AUTH_MODE", "database")
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", "16"))
+
+# Hashes made with any other cost are rehashed on the next successful login
+password_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 security = HTTPBearer()
 
@@ -33,12 +51,71 @@ class LoginRequest(BaseModel):
     password: str
 
 
-def hash_password(password: str) -> str:
-    return password_context.hash(password)
-
-
-def verify_password(password: str, hashed_password: str) -> bool:
-    return password_context.verify(password, hashed_password)
+class PasswordHasher:
+    def __init__(self, workers: int, concurrency: int):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self.slots = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.calls = 0
+        self.waiting = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    @staticmethod
+    def _timed(fn, *args):
+        started_at = time.perf_counter()
+        result = fn(*args)
+        return result, started_at, time.perf_counter()
+
+    async def run(self, fn, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            result, started_at, finished_at = await loop.run_in_executor(
+                self.executor, self._timed, fn, *args
+            )
+        finally:
+            self.slots.release()
+
+        queue_time = started_at - queued_at
+        self.calls += 1
+        self.queue_seconds += queue_time
+        self.max_queue_seconds = max(self.max_queue_seconds, queue_time)
+        self.hash_seconds += finished_at - started_at
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "waiting": self.waiting,
+            "concurrency": self.concurrency,
+            "queue_seconds_total": self.queue_seconds,
+            "queue_seconds_max": self.max_queue_seconds,
+            "hash_seconds_total": self.hash_seconds,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_CONCURRENCY)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(password_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(password_context.verify, password, hashed_password)
 
 
 async def get_user(username: str, db):
@@ -50,8 +127,17 @@ async def get_user(username: str, db):
 
 async def authenticate_user(username: str, password: str, db):
     user = await get_user(username, db)
-    if not (user and verify_password(password, user.hashed_password)):
+    if not user:
+        return None
+
+    valid, new_hash = await password_hasher.run(
+        password_context.verify_and_update, password, user.hashed_password
+    )
+    if not valid:
         return None
+
+    if new_hash:
+        await update_user_password(username, new_hash, db)
     return user
 
 
@@ -80,10 +166,16 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = await get_user(username, db)
+    if AUTH_MODE == "claims":
+        user = await get_cached_user_by_username(username, db)
+        if user is None or user["role"] != payload.get("role"):
+            raise credentials_exception
+        return {"sub": username, "role": payload["role"], "id": user["_id"]}
+
+    user = await get_user_by_username(username, db)
     if user is None:
         raise credentials_exception
-    return UserBase(**user.model_dump())
+    return {"sub": user["username"], "role": user["role"], "id": user["_id"]}
 
 
 async def ensure_admin_user(db):
@@ -95,7 +187,7 @@ async def ensure_admin_user(db):
         from src.crud.user import create_user
         from src.models.user import UserCreate
 
-        hashed_password = hash_password(admin_password)
+        hashed_password = await hash_password(admin_password)
         await create_user(
             user=UserCreate(
                 username=admin_username, password= admin_password,role=Role.ADMIN
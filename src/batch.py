@@ -0,0 +1,25 @@
+import os
+from typing import List
+
+from bson import ObjectId
+from pydantic import BaseModel, Field
+
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "100"))
+
+
+class BatchRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+def object_ids(ids: List[str]) -> List[ObjectId]:
+    # Malformed ids can't match anything, they are reported as missing
+    return [ObjectId(id) for id in dict.fromkeys(ids) if ObjectId.is_valid(id)]
+
+
+def ordered_batch(ids: List[str], documents: list) -> dict:
+    by_id = {str(document["_id"]): document for document in documents}
+    unique_ids = dict.fromkeys(ids)
+    return {
+        "items": [by_id[id] for id in unique_ids if id in by_id],
+        "missing": [id for id in unique_ids if id not in by_id],
+    }
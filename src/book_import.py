@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+
+from pydantic import ValidationError
+
+from src.crud.book import insert_books
+from src.crud.catalog import catalog_changes
+from src.database import close_mongo_connection, connect_to_mongo, get_database
+from src.indexes import has_index, index_model
+from src.models.book import BookCreate, BookImportFormat
+
+BOOK_IMPORT_BATCH_SIZE = int(os.environ.get("BOOK_IMPORT_BATCH_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 1000
+
+CSV_COUNT_FIELDS = ("total_count", "available_count")
+
+# Rows are never looked up before the insert, duplicates are only caught by this
+BOOK_UNIQUE_INDEX = index_model("books", "title_author")
+
+
+class MissingUniqueIndex(Exception):
+    def __init__(self):
+        super().__init__(
+            "The unique (title, author) index on books is missing, so duplicates "
+            "would not be rejected; remove the duplicate books and run "
+            "python -m src.indexes apply"
+        )
+
+
+def guess_format(filename: str):
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return BookImportFormat.CSV
+    if extension in (".ndjson", ".jsonl"):
+        return BookImportFormat.NDJSON
+    return None
+
+
+def _csv_row(row: dict) -> dict:
+    row = {k: v.strip() for k, v in row.items() if k and v and v.strip()}
+    for field in CSV_COUNT_FIELDS:
+        if field in row:
+            row[field] = int(row[field])
+    return row
+
+
+def _parse_rows(stream, format: BookImportFormat):
+    if format == BookImportFormat.CSV:
+        for row_number, row in enumerate(csv.DictReader(stream), start=1):
+            try:
+                yield row_number, _csv_row(row)
+            except ValueError as error:
+                yield row_number, error
+        return
+
+    for row_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as error:
+            yield row_number, error
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}"
+            for e in error.errors()
+        )
+    return str(error)
+
+
+def validated_batches(stream, format: BookImportFormat, batch_size: int):
+    books, errors = [], []
+    for row_number, row in _parse_rows(stream, format):
+        if isinstance(row, Exception):
+            errors.append((row_number, _error_message(row)))
+        else:
+            try:
+                books.append((row_number, BookCreate.model_validate(row).model_dump()))
+            except (ValidationError, TypeError) as error:
+                errors.append((row_number, _error_message(error)))
+
+        if len(books) + len(errors) >= batch_size:
+            yield books, errors
+            books, errors = [], []
+
+    if books or errors:
+        yield books, errors
+
+
+async def import_books(
+    stream, format: BookImportFormat, db, batch_size: int = BOOK_IMPORT_BATCH_SIZE
+):
+    if not await has_index(db.books, BOOK_UNIQUE_INDEX):
+        raise MissingUniqueIndex()
+
+    started_at = time.perf_counter()
+    report = {"rows": 0, "inserted": 0, "failed": 0, "errors": []}
+
+    def add_errors(errors):
+        report["failed"] += len(errors)
+        room = max(MAX_REPORTED_ERRORS - len(report["errors"]), 0)
+        report["errors"].extend(
+            {"row": row_number, "error": message}
+            for row_number, message in errors[:room]
+        )
+
+    # Parsing reads the file, so it runs off the event loop one batch at a time
+    batches = validated_batches(stream, format, batch_size)
+    while True:
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            break
+
+        books, errors = batch
+        report["rows"] += len(books) + len(errors)
+        add_errors(errors)
+
+        inserted, write_errors = await insert_books([book for _, book in books], db)
+        report["inserted"] += inserted
+        add_errors([(books[index][0], message) for index, message in write_errors])
+
+    seconds = time.perf_counter() - started_at
+    report["errors"].sort(key=lambda error: error["row"])
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["rows"] / seconds, 1) if seconds else 0.0
+    return report
+
+
+async def _main(path: str, format: BookImportFormat, batch_size: int):
+    await connect_to_mongo()
+    db = await get_database()
+    try:
+        with open(path, encoding="utf-8", newline="") as stream:
+            report = await import_books(stream, format, db, batch_size)
+        print(json.dumps(report, indent=2))
+    except MissingUniqueIndex as error:
+        raise SystemExit(str(error))
+    finally:
+        await catalog_changes.flush()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import books from CSV or NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=[f.value for f in BookImportFormat])
+    parser.add_argument("--batch-size", type=int, default=BOOK_IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    format = BookImportFormat(args.format) if args.format else guess_format(args.path)
+    if format is None:
+        parser.error("could not guess the file format, pass --format")
+    asyncio.run(_main(args.path, format, args.batch_size))
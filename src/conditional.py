@@ -0,0 +1,67 @@
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Depends, HTTPException, Request, status
+
+from src.crud.catalog import catalog_changes, get_catalog_version
+from src.database import get_catalog_database, settings
+
+# On a secondary the books can lag behind the version read just before them, and
+# the stale page would be cached under the new ETag, so validators need the primary
+CONDITIONAL_CATALOG_READS = settings.catalog_read_preference == "primary"
+
+
+def _etag(version: int, request: Request) -> str:
+    # Every URL (path, filters, page, fields) is its own representation
+    url = request.url.path + "?" + request.url.query
+    digest = hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _not_modified_since(updated_at, if_modified_since: str) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return since.tzinfo is not None and updated_at.replace(microsecond=0) <= since
+
+
+async def catalog_validators(
+    request: Request, db=Depends(get_catalog_database)
+) -> dict:
+    # Answers repeat reads with 304 from the cached catalog version, before the
+    # route queries the books. None off the primary, or while this process has
+    # a change the stored version doesn't count yet
+    if not CONDITIONAL_CATALOG_READS or catalog_changes.pending:
+        return {}
+
+    version = await get_catalog_version(db)
+    # Routes serving cached books check them against the version in the ETag
+    request.state.catalog_version = version["version"]
+    headers = {
+        "ETag": _etag(version["version"], request),
+        "Cache-Control": "no-cache",
+    }
+    updated_at = version["updated_at"]
+    if updated_at:
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(headers["ETag"], if_none_match)
+    else:
+        not_modified = bool(
+            updated_at
+            and if_modified_since
+            and _not_modified_since(updated_at, if_modified_since)
+        )
+    if not_modified:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return headers
@@ -1,28 +1,99 @@
-from typing import Optional
+import os
+from typing import List, Optional
 
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 
+from src.batch import object_ids
+from src.cache import TTLCache
+from src.crud.catalog import mark_catalog_changed
 from src.models.book import BookCreate, BookUpdate
+from src.pagination import paginate
 
+BOOK_CACHE_ENABLED = os.environ.get("BOOK_CACHE_ENABLED", "true").lower() == "true"
+BOOK_CACHE_SIZE = int(os.environ.get("BOOK_CACHE_SIZE", "1024"))
+BOOK_CACHE_TTL = float(os.environ.get("BOOK_CACHE_TTL", "60"))
+
+book_cache = TTLCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL, BOOK_CACHE_ENABLED)
+# title -> id; a hit only counts if the cached book still has that title
+book_title_cache = TTLCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL, BOOK_CACHE_ENABLED)
+
+
+def cache_book(book: dict, catalog_version: Optional[int] = None):
+    # Entries remember the catalog version read before the book, when known
+    book_cache.set(book["_id"], (catalog_version, dict(book)))
+    book_title_cache.set(book["title"], book["_id"])
+
+
+def cached_book(id: str, catalog_version: Optional[int] = None) -> Optional[dict]:
+    entry = book_cache.get(id)
+    if not entry:
+        return None
+    read_at, book = entry
+    # Writes in other processes don't invalidate this cache, so a book served
+    # under a catalog ETag must have been read at that same version
+    if catalog_version is not None and read_at != catalog_version:
+        return None
+    return dict(book)
+
+
+def invalidate_book(id: str):
+    book_cache.pop(id)
+
+
+async def get_book_by_id(id: str, db, catalog_version: Optional[int] = None):
+    cached = cached_book(id, catalog_version)
+    if cached:
+        return cached
 
-async def get_book_by_id(id: str, db):
     book = await db.books.find_one({"_id": ObjectId(id)})
 
     if not book:
         return None
 
     book["_id"] = str(book["_id"])
+    cache_book(book, catalog_version)
     return book
 
 
 async def get_book_by_title(title: str, db):
+    id = book_title_cache.get(title)
+    cached = cached_book(id) if id else None
+    if cached and cached["title"] == title:
+        return cached
+
     book = await db.books.find_one({"title": title})
 
     if not book:
         return None
+
+    book["_id"] = str(book["_id"])
+    cache_book(book)
     return book
 
 
+async def get_books_by_ids(ids: List[str], db):
+    books, misses = [], []
+    for id in dict.fromkeys(ids):
+        cached = cached_book(id)
+        if cached:
+            books.append(cached)
+        else:
+            misses.append(id)
+
+    if misses:
+        found = await db.books.find({"_id": {"$in": object_ids(misses)}}).to_list(
+            length=None
+        )
+        for book in found:
+            book["_id"] = str(book["_id"])
+            cache_book(book)
+            books.append(book)
+
+    return books
+
+
 async def search_book(
     db,
     skip: int,
@@ -30,6 +101,8 @@ async def search_book(
     title: Optional[str] = None,
     author: Optional[str] = None,
     category: Optional[str] = None,
+    after: Optional[ObjectId] = None,
+    projection: Optional[dict] = None,
 ):
 
     search_query = []
@@ -41,16 +114,28 @@ async def search_book(
     if category:
         search_query.append({"category": {"$regex": category, "$options": "i"}})
 
+    search_result = await paginate(
+        db.books, {"$or": search_query}, skip, limit, after, projection
+    ).to_list(length=limit)
+
+    return search_result
+
+
+async def search_book_ranked(
+    db, query: str, skip: int, limit: int, projection: Optional[dict] = None
+):
+    text_score = {"$meta": "textScore"}
+
     search_result = (
-        await db.books.find({"$or": search_query})
+        await db.books.find(
+            {"$text": {"$search": query}}, {**(projection or {}), "score": text_score}
+        )
+        .sort([("score", text_score)])
         .skip(skip)
         .limit(limit)
         .to_list(length=limit)
     )
 
-    for book in search_result:
-        book["_id"] = str(book.pop("_id"))
-
     return search_result
 
 
@@ -62,40 +147,121 @@ async def check_book_uniqueness(title: str, author: str, db):
     return False
 
 
-async def get_books(db, skip: int, limit: int):
-    books = await db.books.find().skip(skip).limit(limit).to_list(length=limit)
-
-    for book in books:
-        book["_id"] = str(book["_id"])
+async def get_books(
+    db,
+    skip: int,
+    limit: int,
+    after: Optional[ObjectId] = None,
+    projection: Optional[dict] = None,
+):
+    books = await paginate(db.books, {}, skip, limit, after, projection).to_list(
+        length=limit
+    )
 
     return books
 
 
+def stream_books(db, batch_size: int):
+    return db.books.find().sort("_id", 1).batch_size(batch_size)
+
+
 async def create_book(book: BookCreate, db):
     book_dict = book.model_dump()
 
     result = await db.books.insert_one(book_dict)
-    created_book = await db.books.find_one({"_id": result.inserted_id})
 
-    created_book["_id"] = str(created_book["_id"])
-    return created_book
+    book_dict["_id"] = str(result.inserted_id)
+    cache_book(book_dict)
+    mark_catalog_changed(db)
+    return book_dict
+
+
+async def insert_books(books: List[dict], db):
+    if not books:
+        return 0, []
+
+    try:
+        result = await db.books.insert_many(books, ordered=False)
+    except BulkWriteError as error:
+        write_errors = [
+            (
+                e["index"],
+                (
+                    "Book with this title and author exists"
+                    if e["code"] == 11000
+                    else e["errmsg"]
+                ),
+            )
+            for e in error.details["writeErrors"]
+        ]
+        if error.details["nInserted"]:
+            mark_catalog_changed(db)
+        return error.details["nInserted"], write_errors
+
+    mark_catalog_changed(db)
+    return len(result.inserted_ids), []
 
 
 async def update_book(id: str, book: BookUpdate, db):
     updated_data = {k: v for k, v in book.model_dump().items() if v is not None}
 
+    invalidate_book(id)
     if updated_data:
-        await db.books.update_one({"_id": ObjectId(id)}, {"$set": updated_data})
-
-    updated_book = await db.books.find_one({"_id": ObjectId(id)})
+        updated_book = await db.books.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$set": updated_data},
+            return_document=ReturnDocument.AFTER,
+        )
+    else:
+        updated_book = await db.books.find_one({"_id": ObjectId(id)})
+
+    if not updated_book:
+        return None
 
     updated_book["_id"] = str(updated_book["_id"])
+    cache_book(updated_book)
+    if updated_data:
+        mark_catalog_changed(db)
     return updated_book
 
 
+async def _inc_available_count(query: dict, amount: int, db, session=None):
+    book = await db.books.find_one_and_update(
+        query,
+        {"$inc": {"available_count": amount}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+    if not book:
+        return None
+
+    book["_id"] = str(book["_id"])
+    # Inside a transaction the new count is not committed yet, the caller marks
+    # the catalog changed after the commit
+    if session:
+        invalidate_book(book["_id"])
+    else:
+        cache_book(book)
+        mark_catalog_changed(db)
+    return book
+
+
+async def checkout_book(title: str, db, session=None):
+    return await _inc_available_count(
+        {"title": title, "available_count": {"$gt": 0}}, -1, db, session
+    )
+
+
+async def checkin_book(title: str, db, session=None):
+    return await _inc_available_count({"title": title}, 1, db, session)
+
+
 async def delete_book(id: str, db):
     result = await db.books.delete_one({"_id": ObjectId(id)})
+    invalidate_book(id)
 
     if result.deleted_count == 0:
         return False
+    mark_catalog_changed(db)
     return True
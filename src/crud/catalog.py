@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from src.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a process reuses the catalog version before reading it again; other
+# processes see a write after at most this long
+CATALOG_VERSION_TTL = float(os.environ.get("CATALOG_VERSION_TTL", "2"))
+
+# Seconds before retrying a failed version bump, doubling up to the maximum
+CATALOG_BUMP_RETRY = float(os.environ.get("CATALOG_BUMP_RETRY", "0.5"))
+CATALOG_BUMP_RETRY_MAX = float(os.environ.get("CATALOG_BUMP_RETRY_MAX", "30"))
+# Seconds shutdown waits for a pending bump
+CATALOG_FLUSH_TIMEOUT = float(os.environ.get("CATALOG_FLUSH_TIMEOUT", "10"))
+
+CATALOG_VERSION_ID = "catalog_version"
+
+catalog_version_cache = TTLCache(1, CATALOG_VERSION_TTL, CATALOG_VERSION_TTL > 0)
+
+
+def _version(document) -> dict:
+    if not document:
+        return {"version": 0, "updated_at": None}
+    updated_at = document["updated_at"]
+    # pymongo returns naive datetimes in UTC
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return {"version": document["version"], "updated_at": updated_at}
+
+
+class CatalogChanges:
+    # Book writes only mark the catalog as changed; one background task bumps the
+    # version after them, so writes never wait for it or hold it in a transaction,
+    # and a burst of checkouts costs one bump instead of one each
+    def __init__(self):
+        self.dirty = False
+        self.flusher = None
+
+    @property
+    def pending(self) -> bool:
+        return self.dirty or self.flusher is not None
+
+    def mark(self, db):
+        self.dirty = True
+        catalog_version_cache.pop(CATALOG_VERSION_ID)
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush(db))
+
+    async def _flush(self, db):
+        delay = CATALOG_BUMP_RETRY
+        try:
+            while self.dirty:
+                self.dirty = False
+                try:
+                    await bump_catalog_version(db)
+                except PyMongoError as error:
+                    # Stays pending until a bump lands, so the version from
+                    # before the change is never cached
+                    self.dirty = True
+                    logger.warning(
+                        "Could not bump the catalog version, retrying in %.1f s: %s",
+                        delay,
+                        error,
+                    )
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, CATALOG_BUMP_RETRY_MAX)
+                else:
+                    delay = CATALOG_BUMP_RETRY
+        finally:
+            self.flusher = None
+
+    async def flush(self, timeout: float = CATALOG_FLUSH_TIMEOUT):
+        if self.flusher is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self.flusher), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Gave up on the pending catalog version bump")
+            self.flusher.cancel()
+
+
+catalog_changes = CatalogChanges()
+
+
+def mark_catalog_changed(db):
+    # Call once the book write is committed, never inside a transaction
+    catalog_changes.mark(db)
+
+
+async def get_catalog_version(db) -> dict:
+    cached = catalog_version_cache.get(CATALOG_VERSION_ID)
+    if cached:
+        return cached
+
+    version = _version(await db.jobs.find_one({"_id": CATALOG_VERSION_ID}))
+    # A version read before a pending bump must not outlive it
+    if not catalog_changes.pending:
+        catalog_version_cache.set(CATALOG_VERSION_ID, version)
+    return version
+
+
+async def bump_catalog_version(db) -> dict:
+    document = await db.jobs.find_one_and_update(
+        {"_id": CATALOG_VERSION_ID},
+        {
+            "$inc": {"version": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    version = _version(document)
+    if not catalog_changes.dirty:
+        catalog_version_cache.set(CATALOG_VERSION_ID, version)
+    return version
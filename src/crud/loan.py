@@ -1,27 +1,34 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 
 from bson import ObjectId
+from pymongo import ReturnDocument
 
+from src.batch import object_ids
 from src.models.loan import LoanCreate, LoanStatus, LoanUpdate
+from src.pagination import paginate
 
+LOAN_PERIOD = timedelta(days=14)
 
-async def create_loan(loan: LoanCreate, db):
+# Loans whose book is out of the library
+CHECKED_OUT_STATUSES = [LoanStatus.APPROVED.value, LoanStatus.RENEW_PENDING.value]
+
+
+async def create_loan(loan: LoanCreate, db, session=None):
     loan_dict = loan.model_dump()
 
     now = datetime.now()
     loan_dict["date"] = now
-    loan_dict["return_date"] = now + timedelta(days=14)
+    loan_dict["return_date"] = now + LOAN_PERIOD
 
-    result = await db.loans.insert_one(loan_dict)
-    created_book = await db.loans.find_one({"_id": result.inserted_id})
+    result = await db.loans.insert_one(loan_dict, session=session)
 
-    created_book["_id"] = str(created_book["_id"])
-    return created_book
+    loan_dict["_id"] = str(result.inserted_id)
+    return loan_dict
 
 
-async def get_loan(id: str, db):
-    loan = await db.loans.find_one({"_id": ObjectId(id)})
+async def get_loan(id: str, db, projection: Optional[dict] = None, session=None):
+    loan = await db.loans.find_one({"_id": ObjectId(id)}, projection, session=session)
 
     if not loan:
         return None
@@ -30,51 +37,69 @@ async def get_loan(id: str, db):
     return loan
 
 
-async def get_loans(db, skip: int, limit: int, status: Optional[LoanStatus] = None):
-    if status:
-        loans = (
-            await db.loans.find({"status": status.value})
-            .skip(skip)
-            .limit(limit)
-            .to_list(length=limit)
-        )
-    else:
-        loans = await db.loans.find().skip(skip).limit(limit).to_list(length=limit)
-
-    for loan in loans:
-        loan["_id"] = str(loan["_id"])
+async def get_loans_by_ids(
+    ids: List[str],
+    db,
+    username: Optional[str] = None,
+    projection: Optional[dict] = None,
+):
+    query = {"_id": {"$in": object_ids(ids)}}
+    if username:
+        query["username"] = username
+    return await db.loans.find(query, projection).to_list(length=None)
+
+
+async def get_loans(
+    db,
+    skip: int,
+    limit: int,
+    status: Optional[LoanStatus] = None,
+    after: Optional[ObjectId] = None,
+    projection: Optional[dict] = None,
+):
+    query = {"status": status.value} if status else {}
+    loans = await paginate(db.loans, query, skip, limit, after, projection).to_list(
+        length=limit
+    )
 
     return loans
 
 
-async def get_user_loans(db, username: str, skip=0, limit=10):
-    loans = (
-        await db.loans.find({"username": username})
-        .skip(skip)
-        .limit(limit)
-        .to_list(length=limit)
-    )
-
-    for loan in loans:
-        loan["_id"] = str(loan["_id"])
+async def get_user_loans(
+    db,
+    username: str,
+    skip=0,
+    limit=10,
+    after: Optional[ObjectId] = None,
+    projection: Optional[dict] = None,
+):
+    loans = await paginate(
+        db.loans, {"username": username}, skip, limit, after, projection
+    ).to_list(length=limit)
 
     return loans
 
 
-async def get_book_loans(db, book_title: str, skip: int, limit: int):
-    loans = (
-        await db.loans.find({"book_title": book_title})
-        .skip(skip)
-        .limit(limit)
-        .to_list(length=limit)
-    )
-
-    for loan in loans:
-        loan["_id"] = str(loan["_id"])
+async def get_book_loans(
+    db,
+    book_title: str,
+    skip: int,
+    limit: int,
+    after: Optional[ObjectId] = None,
+    projection: Optional[dict] = None,
+):
+    loans = await paginate(
+        db.loans, {"book_title": book_title}, skip, limit, after, projection
+    ).to_list(length=limit)
 
     return loans
 
 
+def stream_loans(db, batch_size: int, status: Optional[LoanStatus] = None):
+    query = {"status": status.value} if status else {}
+    return db.loans.find(query).sort("_id", 1).batch_size(batch_size)
+
+
 async def existing_loan(username: str, book_title: str, db):
     existing = await db.loans.find_one({"username": username, "book_title": book_title})
 
@@ -88,15 +113,96 @@ async def existing_loan(username: str, book_title: str, db):
 async def update_loan(id: str, loan_update: LoanUpdate, db):
     loan = {k: v for k, v in loan_update.model_dump().items() if v is not None}
 
-    await db.loans.update_one({"_id": ObjectId(id)}, {"$set": loan})
+    updated_loan = await db.loans.find_one_and_update(
+        {"_id": ObjectId(id)}, {"$set": loan}, return_document=ReturnDocument.AFTER
+    )
+
+    if not updated_loan:
+        return None
 
-    updated_loan = await get_loan(id, db)
+    updated_loan["_id"] = str(updated_loan["_id"])
     return updated_loan
 
 
-async def delete_loan(id: str, db):
-    deleted_loan = await db.loans.delete_one({"_id": ObjectId(id)})
+async def approve_loan(id: str, db, session=None) -> Optional[dict]:
+    now = datetime.now()
+    approved_loan = await db.loans.find_one_and_update(
+        {"_id": ObjectId(id), "status": LoanStatus.PENDING.value},
+        {
+            "$set": {
+                "status": LoanStatus.APPROVED.value,
+                "date": now,
+                "return_date": now + LOAN_PERIOD,
+                "overdue": False,
+            }
+        },
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
 
-    if deleted_loan.deleted_count == 0:
-        return False
-    return True
+    if not approved_loan:
+        return None
+
+    approved_loan["_id"] = str(approved_loan["_id"])
+    return approved_loan
+
+
+async def return_loan(
+    id: str, db, username: Optional[str] = None, session=None
+) -> Optional[dict]:
+    query = {"_id": ObjectId(id), "status": {"$in": CHECKED_OUT_STATUSES}}
+    if username:
+        query["username"] = username
+
+    return await db.loans.find_one_and_update(
+        query,
+        {"$set": {"status": LoanStatus.RETURNED.value, "overdue": False}},
+        projection={"username": 1, "book_title": 1},
+        session=session,
+    )
+
+
+async def request_loan_renewal(id: str, username: str, db, session=None) -> bool:
+    result = await db.loans.update_one(
+        {
+            "_id": ObjectId(id),
+            "username": username,
+            "status": LoanStatus.APPROVED.value,
+        },
+        {"$set": {"status": LoanStatus.RENEW_PENDING.value}},
+        session=session,
+    )
+    return result.modified_count == 1
+
+
+async def renew_loan(id: str, db, session=None) -> Optional[dict]:
+    # Extends return_date server side, so the loan doesn't have to be read first
+    now = datetime.now()
+    return await db.loans.find_one_and_update(
+        {"_id": ObjectId(id), "status": {"$in": CHECKED_OUT_STATUSES}},
+        [
+            {
+                "$set": {
+                    "status": LoanStatus.APPROVED.value,
+                    "return_date": {
+                        "$add": [
+                            "$return_date",
+                            int(LOAN_PERIOD.total_seconds() * 1000),
+                        ]
+                    },
+                }
+            },
+            {"$set": {"overdue": {"$lt": ["$return_date", now]}}},
+        ],
+        projection={"username": 1, "status": 1, "return_date": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+
+async def delete_loan(id: str, db, session=None) -> Optional[dict]:
+    return await db.loans.find_one_and_delete(
+        {"_id": ObjectId(id)},
+        projection={"username": 1, "book_title": 1, "status": 1},
+        session=session,
+    )
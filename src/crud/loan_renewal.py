@@ -2,22 +2,23 @@ from datetime import datetime
 from typing import Optional
 
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from src.models.loan_renewal import LibrarianStatus, LoanRenewalCreate
+from src.pagination import paginate
 
 
 async def create_loan_renewal(
-    loan_renewal: LoanRenewalCreate, status: LibrarianStatus, db
+    loan_renewal: LoanRenewalCreate, status: LibrarianStatus, db, session=None
 ):
     loan_renewal_dict = loan_renewal.model_dump()
     loan_renewal_dict["status"] = status.value
     loan_renewal_dict["date"] = datetime.now()
 
-    result = await db.loan_renewals.insert_one(loan_renewal_dict)
-    created_loan_renewal = await db.loan_renewals.find_one({"_id": result.inserted_id})
+    result = await db.loan_renewals.insert_one(loan_renewal_dict, session=session)
 
-    created_loan_renewal["_id"] = str(created_loan_renewal["_id"])
-    return created_loan_renewal
+    loan_renewal_dict["_id"] = str(result.inserted_id)
+    return loan_renewal_dict
 
 
 async def get_loan_renewal(id: str, db):
@@ -31,36 +32,26 @@ async def get_loan_renewal(id: str, db):
 
 
 async def get_loan_renewals(
-    db, skip: int, limit: int, status: Optional[LibrarianStatus] = None
+    db,
+    skip: int,
+    limit: int,
+    status: Optional[LibrarianStatus] = None,
+    after: Optional[ObjectId] = None,
 ):
-    if status:
-        loan_renewals = (
-            await db.loan_renewals.find({"status": status.value})
-            .skip(skip)
-            .limit(limit)
-            .to_list(length=limit)
-        )
-    else:
-        loan_renewals = (
-            await db.loan_renewals.find().skip(skip).limit(limit).to_list(length=limit)
-        )
-
-    for loan_renewal in loan_renewals:
-        loan_renewal["_id"] = str(loan_renewal["_id"])
+    query = {"status": status.value} if status else {}
+    loan_renewals = await paginate(db.loan_renewals, query, skip, limit, after).to_list(
+        length=limit
+    )
 
     return loan_renewals
 
 
-async def get_loan_id_renewals(db, loan_id: str, skip: int, limit: int):
-    loan_renewals = (
-        await db.loan_renewals.find({"loan_id": loan_id})
-        .skip(skip)
-        .limit(limit)
-        .to_list(length=limit)
-    )
-
-    for loan_renewal in loan_renewals:
-        loan_renewal["_id"] = str(loan_renewal["_id"])
+async def get_loan_id_renewals(
+    db, loan_id: str, skip: int, limit: int, after: Optional[ObjectId] = None
+):
+    loan_renewals = await paginate(
+        db.loan_renewals, {"loan_id": loan_id}, skip, limit, after
+    ).to_list(length=limit)
 
     return loan_renewals
 
@@ -80,14 +71,35 @@ async def update_loan_renewal(
     id: str,
     status: LibrarianStatus,
 ):
-    await db.loan_renewals.update_one(
-        {"_id": ObjectId(id)}, {"$set": {"status": status.value}}
+    updated_loan_renewal = await db.loan_renewals.find_one_and_update(
+        {"_id": ObjectId(id)},
+        {"$set": {"status": status.value}},
+        return_document=ReturnDocument.AFTER,
     )
 
-    updated_loan_renewal = await get_loan_renewal(id, db)
+    if not updated_loan_renewal:
+        return None
+
+    updated_loan_renewal["_id"] = str(updated_loan_renewal["_id"])
     return updated_loan_renewal
 
 
+async def approve_loan_renewal(id: str, db, session=None):
+    # Matching on PENDING makes a second approval of the same request a no-op
+    approved = await db.loan_renewals.find_one_and_update(
+        {"_id": ObjectId(id), "status": LibrarianStatus.PENDING.value},
+        {"$set": {"status": LibrarianStatus.APPROVED.value}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+    if not approved:
+        return None
+
+    approved["_id"] = str(approved["_id"])
+    return approved
+
+
 async def delete_loan_renewal(id: str, db):
     deleted_loan_renewal = await db.loan_renewals.delete_one({"_id": ObjectId(id)})
 
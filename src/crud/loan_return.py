@@ -2,22 +2,29 @@ from datetime import datetime
 from typing import Optional
 
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from src.models.loan_return import LibrarianStatus, LoanReturnCreate
+from src.pagination import paginate
 
 
 async def create_loan_return(
-    loan_return: LoanReturnCreate, status: LibrarianStatus, db
+    loan_return: LoanReturnCreate,
+    status: LibrarianStatus,
+    db,
+    book_title: Optional[str] = None,
+    session=None,
 ):
     loan_return_dict = loan_return.model_dump()
     loan_return_dict["status"] = status.value
     loan_return_dict["date"] = datetime.now()
+    if book_title:
+        loan_return_dict["book_title"] = book_title
 
-    result = await db.loan_returns.insert_one(loan_return_dict)
-    created_loan_return = await db.loan_returns.find_one({"_id": result.inserted_id})
+    result = await db.loan_returns.insert_one(loan_return_dict, session=session)
 
-    created_loan_return["_id"] = str(created_loan_return["_id"])
-    return created_loan_return
+    loan_return_dict["_id"] = str(result.inserted_id)
+    return loan_return_dict
 
 
 async def get_loan_return(id: str, db):
@@ -31,36 +38,26 @@ async def get_loan_return(id: str, db):
 
 
 async def get_loan_returns(
-    db, skip: int, limit: int, status: Optional[LibrarianStatus] = None
+    db,
+    skip: int,
+    limit: int,
+    status: Optional[LibrarianStatus] = None,
+    after: Optional[ObjectId] = None,
 ):
-    if status:
-        loan_returns = (
-            await db.loan_returns.find({"status": status.value})
-            .skip(skip)
-            .limit(limit)
-            .to_list(length=limit)
-        )
-    else:
-        loan_returns = (
-            await db.loan_returns.find().skip(skip).limit(limit).to_list(length=limit)
-        )
-
-    for loan_return in loan_returns:
-        loan_return["_id"] = str(loan_return["_id"])
+    query = {"status": status.value} if status else {}
+    loan_returns = await paginate(db.loan_returns, query, skip, limit, after).to_list(
+        length=limit
+    )
 
     return loan_returns
 
 
-async def get_loan_id_returns(db, loan_id: str, skip: int, limit: int):
-    loan_returns = (
-        await db.loan_returns.find({"loan_id": ObjectId(loan_id)})
-        .skip(skip)
-        .limit(limit)
-        .to_list(length=limit)
-    )
-
-    for loan_return in loan_returns:
-        loan_return["_id"] = str(loan_return["_id"])
+async def get_loan_id_returns(
+    db, loan_id: str, skip: int, limit: int, after: Optional[ObjectId] = None
+):
+    loan_returns = await paginate(
+        db.loan_returns, {"loan_id": ObjectId(loan_id)}, skip, limit, after
+    ).to_list(length=limit)
 
     return loan_returns
 
@@ -80,14 +77,35 @@ async def update_loan_return(
     id: str,
     status: LibrarianStatus,
 ):
-    await db.loan_returns.update_one(
-        {"_id": ObjectId(id)}, {"$set": {"status": status.value}}
+    updated_loan_return = await db.loan_returns.find_one_and_update(
+        {"_id": ObjectId(id)},
+        {"$set": {"status": status.value}},
+        return_document=ReturnDocument.AFTER,
     )
 
-    updated_loan_return = await get_loan_return(id, db)
+    if not updated_loan_return:
+        return None
+
+    updated_loan_return["_id"] = str(updated_loan_return["_id"])
     return updated_loan_return
 
 
+async def approve_loan_return(id: str, db, session=None):
+    # Matching on PENDING makes a second approval of the same request a no-op
+    approved = await db.loan_returns.find_one_and_update(
+        {"_id": ObjectId(id), "status": LibrarianStatus.PENDING.value},
+        {"$set": {"status": LibrarianStatus.APPROVED.value}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+    if not approved:
+        return None
+
+    approved["_id"] = str(approved["_id"])
+    return approved
+
+
 async def delete_loan_return(id: str, db):
     deleted_loan_return = await db.loan_returns.delete_one({"_id": ObjectId(id)})
 
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from src.crud.loan import CHECKED_OUT_STATUSES
+from src.models.loan import LoanStatus
+
+# Per-loan fields kept in user_loan_summary.loans
+SNAPSHOT_FIELDS = ("book_title", "status", "date", "return_date")
+REBUILD_ATTEMPTS = 3
+
+# One document per username holding its not yet returned loans, so the
+# "already loaned" check and /loan/my_loans are a single _id read. Every loan
+# transition bumps "version"; a rebuild only stores its result if no
+# transition happened while it was reading the loans.
+
+
+def loan_snapshot(loan: dict) -> dict:
+    snapshot = {"_id": ObjectId(loan["_id"])}
+    snapshot.update({field: loan[field] for field in SNAPSHOT_FIELDS if field in loan})
+    return snapshot
+
+
+def summary_loans(summary: dict) -> list:
+    now = datetime.now()
+    return [
+        {
+            **loan,
+            "username": summary["_id"],
+            "overdue": loan["status"] in CHECKED_OUT_STATUSES
+            and loan["return_date"] < now,
+        }
+        for loan in summary["loans"]
+    ]
+
+
+async def rebuild_loan_summary(username: str, db) -> dict:
+    for _ in range(REBUILD_ATTEMPTS):
+        # Transitions only update an existing summary, so create an incomplete
+        # one first for them to bump while the loans are read
+        placeholder = await db.user_loan_summary.find_one_and_update(
+            {"_id": username},
+            {"$setOnInsert": {"loans": [], "titles": [], "version": 0}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        loans = await db.loans.find(
+            {"username": username, "status": {"$ne": LoanStatus.RETURNED.value}},
+            dict.fromkeys(SNAPSHOT_FIELDS, 1),
+        ).to_list(length=None)
+
+        summary = {
+            "_id": username,
+            "loans": [loan_snapshot(loan) for loan in loans],
+            "titles": sorted({loan["book_title"] for loan in loans}),
+            "version": placeholder["version"],
+            "complete": True,
+            "rebuilt_at": datetime.now(),
+        }
+        result = await db.user_loan_summary.replace_one(
+            {"_id": username, "version": placeholder["version"]}, summary
+        )
+        if result.matched_count:
+            break
+
+    return summary
+
+
+async def get_loan_summary(username: str, db) -> dict:
+    summary = await db.user_loan_summary.find_one({"_id": username})
+    if summary and summary.get("complete"):
+        return summary
+    return await rebuild_loan_summary(username, db)
+
+
+async def add_summary_loan(loan: dict, db, session=None) -> bool:
+    # Fails when the user already has an active loan of this title
+    result = await db.user_loan_summary.update_one(
+        {"_id": loan["username"], "titles": {"$ne": loan["book_title"]}},
+        {
+            "$push": {"loans": loan_snapshot(loan)},
+            "$addToSet": {"titles": loan["book_title"]},
+            "$inc": {"version": 1},
+        },
+        session=session,
+    )
+    return result.matched_count == 1
+
+
+async def set_summary_loan(username: str, loan_id, fields: dict, db, session=None):
+    result = await db.user_loan_summary.update_one(
+        {"_id": username, "loans._id": ObjectId(loan_id)},
+        {
+            "$set": {f"loans.$.{k}": v for k, v in fields.items()},
+            "$inc": {"version": 1},
+        },
+        session=session,
+    )
+    if not result.matched_count:
+        # Not in the summary (e.g. mid-rebuild); still tell a rebuild to retry
+        await db.user_loan_summary.update_one(
+            {"_id": username}, {"$inc": {"version": 1}}, session=session
+        )
+
+
+async def remove_summary_loan(
+    username: str, loan_id, book_title: str, db, session=None
+):
+    await db.user_loan_summary.update_one(
+        {"_id": username},
+        {
+            "$pull": {"loans": {"_id": ObjectId(loan_id)}, "titles": book_title},
+            "$inc": {"version": 1},
+        },
+        session=session,
+    )
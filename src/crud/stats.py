@@ -0,0 +1,85 @@
+import asyncio
+import os
+from datetime import datetime
+
+from src.cache import TTLCache
+from src.crud.loan import CHECKED_OUT_STATUSES
+from src.models.loan import LoanStatus
+from src.models.loan_return import LibrarianStatus
+
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", "10"))
+
+stats_cache = TTLCache(1, STATS_CACHE_TTL, STATS_CACHE_TTL > 0)
+# Only one request recomputes an expired entry, the others wait for its result
+_circulation_lock = asyncio.Lock()
+
+
+def _status_counts(groups: list, statuses) -> dict:
+    counts = {status.value: 0 for status in statuses}
+    counts.update({group["_id"]: group["count"] for group in groups if group["_id"]})
+    return counts
+
+
+async def _count_by_status(collection, statuses) -> dict:
+    groups = await collection.aggregate(
+        [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    ).to_list(length=None)
+    return _status_counts(groups, statuses)
+
+
+async def _loan_counts(db, now: datetime) -> dict:
+    result = await db.loans.aggregate(
+        [
+            {
+                "$facet": {
+                    "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                    "overdue": [
+                        {
+                            "$match": {
+                                "status": {"$in": CHECKED_OUT_STATUSES},
+                                "return_date": {"$lt": now},
+                            }
+                        },
+                        {"$count": "count"},
+                    ],
+                }
+            }
+        ]
+    ).to_list(length=1)
+
+    facets = result[0] if result else {"by_status": [], "overdue": []}
+    return {
+        "by_status": _status_counts(facets["by_status"], LoanStatus),
+        "overdue": facets["overdue"][0]["count"] if facets["overdue"] else 0,
+    }
+
+
+async def compute_circulation_stats(db) -> dict:
+    now = datetime.now()
+    loans, returns, renewals = await asyncio.gather(
+        _loan_counts(db, now),
+        _count_by_status(db.loan_returns, LibrarianStatus),
+        _count_by_status(db.loan_renewals, LibrarianStatus),
+    )
+    return {
+        "loans": loans["by_status"],
+        "overdue": loans["overdue"],
+        "returns": returns,
+        "renewals": renewals,
+        "generated_at": now,
+    }
+
+
+async def get_circulation_stats(db) -> dict:
+    stats = stats_cache.get("circulation")
+    if stats:
+        return stats
+
+    async with _circulation_lock:
+        stats = stats_cache.get("circulation")
+        if stats:
+            return stats
+
+        stats = await compute_circulation_stats(db)
+        stats_cache.set("circulation", stats)
+        return stats
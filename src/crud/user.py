@@ -1,8 +1,21 @@
+import os
 from datetime import datetime
+from typing import List, Optional
 
 from bson import ObjectId
+from pymongo import ReturnDocument
 
+from src.batch import object_ids
+from src.cache import TTLCache
 from src.models.user import UserCreate, UserUpdate
+from src.pagination import paginate
+from src.projection import USER_PUBLIC_PROJECTION
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "30"))
+
+# username -> user record without the password hash
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
 
 
 async def check_username_exists(username: str, db):
@@ -18,14 +31,13 @@ async def create_user(user: UserCreate, hashed_password: str, db):
     user_dict["created_at"] = datetime.now()
 
     result = await db.users.insert_one(user_dict)
-    created_user = await db.users.find_one({"_id": result.inserted_id})
 
-    created_user["_id"] = str(created_user["_id"])
-    return created_user
+    user_dict["_id"] = str(result.inserted_id)
+    return user_dict
 
 
-async def get_user_by_username(username: str, db):
-    user = await db.users.find_one({"username": username})
+async def get_user_by_username(username: str, db, projection: Optional[dict] = None):
+    user = await db.users.find_one({"username": username}, projection)
 
     if not user:
         return None
@@ -34,8 +46,25 @@ async def get_user_by_username(username: str, db):
     return user
 
 
-async def get_user_by_id(id: str, db):
-    user = await db.users.find_one({"_id": ObjectId(id)})
+async def get_cached_user_by_username(username: str, db):
+    user = user_cache.get(username)
+    if user:
+        return user
+
+    user = await get_user_by_username(username, db)
+
+    if not user:
+        return None
+
+    user.pop("password", None)
+    user_cache.set(username, user)
+    return user
+
+
+async def get_user_by_id(
+    id: str, db, projection: Optional[dict] = USER_PUBLIC_PROJECTION
+):
+    user = await db.users.find_one({"_id": ObjectId(id)}, projection)
 
     if not user:
         return None
@@ -44,29 +73,69 @@ async def get_user_by_id(id: str, db):
     return user
 
 
-async def get_users(db, skip: int, limit: int):
-    users_list = await db.users.find().skip(skip).limit(limit).to_list(length=limit)
+async def get_users_by_ids(
+    ids: List[str], db, projection: Optional[dict] = USER_PUBLIC_PROJECTION
+):
+    return await db.users.find({"_id": {"$in": object_ids(ids)}}, projection).to_list(
+        length=None
+    )
 
-    for user in users_list:
-        user["_id"] = str(user["_id"])
+
+async def get_users(
+    db,
+    skip: int,
+    limit: int,
+    after: Optional[ObjectId] = None,
+    projection: Optional[dict] = USER_PUBLIC_PROJECTION,
+):
+    users_list = await paginate(db.users, {}, skip, limit, after, projection).to_list(
+        length=limit
+    )
 
     return users_list
 
 
+def stream_users(db, batch_size: int):
+    return (
+        db.users.find({}, USER_PUBLIC_PROJECTION).sort("_id", 1).batch_size(batch_size)
+    )
+
+
 async def update_user(id: str, user_update: UserUpdate, db):
     updated_data = {k: v for k, v in user_update.model_dump().items() if v is not None}
 
     if updated_data:
-        await db.users.update_one({"_id": id}, {"$set": updated_data})
+        updated_user = await db.users.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$set": updated_data},
+            return_document=ReturnDocument.AFTER,
+        )
+    else:
+        updated_user = await db.users.find_one({"_id": ObjectId(id)})
+
+    if not updated_user:
+        return None
 
-    updated_user = await db.users.find_one({"_id": ObjectId(id)})
+    # The previous username is not known here, so a rename drops every entry
+    if "username" in updated_data:
+        user_cache.clear()
+    else:
+        user_cache.pop(updated_user["username"])
 
     updated_user["_id"] = str(updated_user["_id"])
     return updated_user
 
 
+async def update_user_password(username: str, hashed_password: str, db):
+    await db.users.update_one(
+        {"username": username}, {"$set": {"password": hashed_password}}
+    )
+    user_cache.pop(username)
+
+
 async def delete_user(username: str, db) -> bool:
     result = await db.users.delete_one({"username": username})
+    user_cache.pop(username)
     if result.deleted_count == 0:
         return False
     return True
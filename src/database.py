@@ -1,27 +1,229 @@
+import logging
 import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional, Tuple
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, monitoring
+from pymongo.errors import PyMongoError
+
+from src.metrics import METRICS_ENABLED, command_metrics, register_pool_metrics
+from src.slow_queries import SLOW_QUERY_ENABLED, slow_query_recorder
+from src.storage.memory import MemoryClient
+
+logger = logging.getLogger(__name__)
 
 DB_NAME = os.environ["MONGO_DB_NAME"]
 
+# "memory" keeps every collection in process, for tests and profiling the app
+# without a database; data is lost when the process exits
+STORAGE_BACKENDS = ("mongo", "memory")
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+@dataclass(frozen=True)
+class MongoSettings:
+    uri: str = "mongodb://mongo:27017"
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+    connect_timeout_ms: int = 20000
+    server_selection_timeout_ms: int = 30000
+    socket_timeout_ms: Optional[int] = None
+    compressors: Tuple[str, ...] = ()
+    catalog_read_preference: str = "primary"
+    # Multi-document transactions need a replica set or sharded cluster
+    transactions: bool = False
+    backend: str = "mongo"
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        defaults = cls()
+        compressors = os.environ.get("MONGO_COMPRESSORS", "")
+        settings = cls(
+            uri=os.environ.get("MONGO_URI", defaults.uri),
+            max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", defaults.max_pool_size),
+            min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", defaults.min_pool_size),
+            max_idle_time_ms=_env_int("MONGO_MAX_IDLE_TIME_MS", None),
+            wait_queue_timeout_ms=_env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+            connect_timeout_ms=_env_int(
+                "MONGO_CONNECT_TIMEOUT_MS", defaults.connect_timeout_ms
+            ),
+            server_selection_timeout_ms=_env_int(
+                "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+                defaults.server_selection_timeout_ms,
+            ),
+            socket_timeout_ms=_env_int("MONGO_SOCKET_TIMEOUT_MS", None),
+            compressors=tuple(c.strip() for c in compressors.split(",") if c.strip()),
+            catalog_read_preference=os.environ.get(
+                "MONGO_CATALOG_READ_PREFERENCE", defaults.catalog_read_preference
+            ),
+            transactions=os.environ.get("MONGO_TRANSACTIONS", "false").lower()
+            == "true",
+            backend=os.environ.get("STORAGE_BACKEND", defaults.backend),
+        )
+        if settings.backend not in STORAGE_BACKENDS:
+            raise ValueError(
+                "STORAGE_BACKEND must be one of " + ", ".join(STORAGE_BACKENDS)
+            )
+        if settings.catalog_read_preference not in READ_PREFERENCES:
+            raise ValueError(
+                "MONGO_CATALOG_READ_PREFERENCE must be one of "
+                + ", ".join(READ_PREFERENCES)
+            )
+        return settings
+
+    def client_options(self) -> dict:
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "compressors": ",".join(self.compressors) or None,
+        }
+        return {k: v for k, v in options.items() if v is not None}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.connections = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_seconds = 0.0
+        self.checkout_wait_seconds_max = 0.0
+
+    def _waited(self, duration: Optional[float]):
+        if duration is not None:
+            self.checkout_wait_seconds += duration
+            self.checkout_wait_seconds_max = max(
+                self.checkout_wait_seconds_max, duration
+            )
+
+    def connection_checked_out(self, event):
+        self.checkouts += 1
+        self.checked_out += 1
+        self._waited(event.duration)
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+        self._waited(event.duration)
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def connection_created(self, event):
+        self.connections += 1
+
+    def connection_closed(self, event):
+        self.connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "checkout_wait_seconds_total": self.checkout_wait_seconds,
+            "checkout_wait_seconds_max": self.checkout_wait_seconds_max,
+        }
+
 
 class Database:
     client: AsyncIOMotorClient = None
 
 
 db = Database()
+settings = MongoSettings.from_env()
+pool_stats = PoolStats()
+if METRICS_ENABLED:
+    register_pool_metrics(pool_stats)
 
 
 async def get_database():
     return db.client[DB_NAME]
 
 
+def database_dependency(read_preference: str):
+    preference = READ_PREFERENCES[read_preference]
+
+    async def get_database_with_read_preference():
+        return db.client.get_database(DB_NAME, read_preference=preference)
+
+    return get_database_with_read_preference
+
+
+# Catalog reads that tolerate replication lag, e.g. /book/list and /book/search
+get_catalog_database = database_dependency(settings.catalog_read_preference)
+
+
+@asynccontextmanager
+async def transaction(db):
+    # Yields the session to pass to every CRUD call, or None when transactions
+    # are off; an exception inside the block aborts the transaction
+    if not settings.transactions or settings.backend == "memory":
+        yield None
+        return
+
+    async with await db.client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+
 async def connect_to_mongo():
-    # TODO: Implement a logger and log database connections
+    if settings.backend == "memory":
+        db.client = MemoryClient()
+        logger.info("Using the in-memory storage backend")
+        return True
+
     try:
-        db.client = AsyncIOMotorClient("mongodb://mongo:27017")
+        listeners = [pool_stats]
+        if METRICS_ENABLED:
+            listeners.append(command_metrics)
+        if SLOW_QUERY_ENABLED:
+            listeners.append(slow_query_recorder)
+        db.client = AsyncIOMotorClient(
+            settings.uri, event_listeners=listeners, **settings.client_options()
+        )
+        logger.info("Connected to MongoDB with %s", settings.client_options())
         return True
-    except:
+    except PyMongoError as error:
+        logger.error("Could not connect to MongoDB: %s", error)
         return False
 
 
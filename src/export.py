@@ -0,0 +1,32 @@
+import os
+from typing import Annotated
+
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+
+from src.serialization import dumps
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+MAX_EXPORT_BATCH_SIZE = int(os.environ.get("MAX_EXPORT_BATCH_SIZE", "10000"))
+
+ExportBatchSize = Annotated[int, Query(ge=1, le=MAX_EXPORT_BATCH_SIZE)]
+
+
+async def ndjson_lines(cursor, batch_size: int):
+    lines = []
+    async for document in cursor:
+        lines.append(dumps(document))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def ndjson_response(cursor, batch_size: int, filename: str):
+    return StreamingResponse(
+        ndjson_lines(cursor, batch_size),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
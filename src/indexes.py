@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from src.crud.loan import CHECKED_OUT_STATUSES
+from src.database import close_mongo_connection, connect_to_mongo, get_database
+
+logger = logging.getLogger(__name__)
+
+# Filtered list queries page by _id, so their indexes end with _id
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username", unique=True),
+    ],
+    "books": [
+        IndexModel(
+            [("title", ASCENDING), ("author", ASCENDING)],
+            name="title_author",
+            unique=True,
+        ),
+        IndexModel([("title", ASCENDING)], name="title"),
+        IndexModel(
+            [("title", TEXT), ("author", TEXT), ("category", TEXT)],
+            weights={"title": 10, "author": 5, "category": 1},
+            name="text",
+        ),
+    ],
+    "loans": [
+        IndexModel(
+            [("username", ASCENDING), ("book_title", ASCENDING)],
+            name="username_book_title",
+        ),
+        IndexModel([("username", ASCENDING), ("_id", ASCENDING)], name="username_id"),
+        IndexModel(
+            [("book_title", ASCENDING), ("_id", ASCENDING)], name="book_title_id"
+        ),
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_id"),
+        IndexModel(
+            [("status", ASCENDING), ("return_date", ASCENDING), ("_id", ASCENDING)],
+            name="status_return_date_id",
+        ),
+    ],
+    "loan_returns": [
+        IndexModel([("loan_id", ASCENDING), ("_id", ASCENDING)], name="loan_id_id"),
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_id"),
+    ],
+    "loan_renewals": [
+        # A loan can be renewed once; renewal requests rely on this to reject
+        # duplicates without looking them up first
+        IndexModel([("loan_id", ASCENDING)], name="loan_id", unique=True),
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_id"),
+    ],
+}
+
+# (query name, collection, filter) for every filter shape the CRUD layer sends
+QUERY_SHAPES = [
+    ("get_user_by_username", "users", {"username": ""}),
+    ("get_book_by_title", "books", {"title": ""}),
+    ("check_book_uniqueness", "books", {"title": "", "author": ""}),
+    ("search_book_ranked", "books", {"$text": {"$search": "library"}}),
+    ("existing_loan", "loans", {"username": "", "book_title": ""}),
+    ("get_user_loans", "loans", {"username": ""}),
+    ("rebuild_loan_summary", "loans", {"username": "", "status": {"$ne": ""}}),
+    ("get_book_loans", "loans", {"book_title": ""}),
+    ("get_loans", "loans", {"status": ""}),
+    (
+        "circulation_overdue",
+        "loans",
+        {"status": {"$in": CHECKED_OUT_STATUSES}, "return_date": {"$lt": datetime.min}},
+    ),
+    ("existing_loan_return", "loan_returns", {"loan_id": ""}),
+    ("get_loan_returns", "loan_returns", {"status": ""}),
+    ("existing_loan_renewal", "loan_renewals", {"loan_id": ""}),
+    ("get_loan_renewals", "loan_renewals", {"status": ""}),
+]
+
+
+def index_model(collection: str, name: str) -> IndexModel:
+    return next(i for i in INDEXES[collection] if i.document["name"] == name)
+
+
+async def has_index(collection, index: IndexModel) -> bool:
+    # Matched on keys and uniqueness, an index built under another name counts
+    keys = list(index.document["key"].items())
+    unique = index.document.get("unique", False)
+    return any(
+        [tuple(key) for key in existing["key"]] == keys
+        and existing.get("unique", False) == unique
+        for existing in (await collection.index_information()).values()
+    )
+
+
+async def _create_indexes(collection, indexes: list, failed: list):
+    try:
+        await collection.create_indexes(indexes)
+    except OperationFailure as error:
+        names = [index.document["name"] for index in indexes]
+        logger.warning(
+            "Could not create %s on %s: %s", ", ".join(names), collection.name, error
+        )
+        failed.extend(f"{collection.name}.{name}" for name in names)
+
+
+async def ensure_indexes(db):
+    failed = []
+    for collection, indexes in INDEXES.items():
+        # createIndexes is all or nothing and a unique index fails on existing
+        # duplicates, so each unique index gets its own call
+        shared = [index for index in indexes if not index.document.get("unique")]
+        if shared:
+            await _create_indexes(db[collection], shared, failed)
+        for index in indexes:
+            if index.document.get("unique"):
+                await _create_indexes(db[collection], [index], failed)
+    return failed
+
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+
+async def index_report(db):
+    report = []
+    for name, collection, query in QUERY_SHAPES:
+        explained = await db.command(
+            {
+                "explain": {"find": collection, "filter": query},
+                "verbosity": "queryPlanner",
+            }
+        )
+        winning_plan = explained["queryPlanner"]["winningPlan"]
+        report.append(
+            {
+                "query": name,
+                "collection": collection,
+                "filter": list(query),
+                "collscan": _has_collscan(winning_plan),
+            }
+        )
+    return report
+
+
+async def _main(command: str):
+    await connect_to_mongo()
+    db = await get_database()
+    try:
+        if command == "apply":
+            failed = await ensure_indexes(db)
+            print(
+                "Failed indexes: " + ", ".join(failed) if failed else "Indexes applied"
+            )
+        else:
+            for entry in await index_report(db):
+                flag = "COLLSCAN" if entry["collscan"] else "ok"
+                print(f"{flag:<9} {entry['collection']:<14} {entry['query']}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument("command", choices=["apply", "report"])
+    asyncio.run(_main(parser.parse_args().command))
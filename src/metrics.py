@@ -0,0 +1,148 @@
+import os
+import time
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+requests_in_progress = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled", ["method"]
+)
+command_duration = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency, as seen by the driver",
+    ["command", "collection"],
+    buckets=MONGO_BUCKETS,
+)
+command_failures = Counter(
+    "mongodb_command_failures_total",
+    "MongoDB commands that failed",
+    ["command", "collection"],
+)
+admission_shed = Counter(
+    "admission_shed_total",
+    "Requests turned away by admission control",
+    ["route_class", "reason"],
+)
+
+
+class MetricsMiddleware:
+    # Plain ASGI, so a request only pays for a timer and two label lookups
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = requests_in_progress.labels(method)
+        in_progress.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            # Set by the router on a match; templates keep the label set bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_duration.labels(method, route, status_code).observe(
+                time.perf_counter() - started_at
+            )
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request id) -> collection, the reply events don't carry it
+        self.collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        key = (event.connection_id, event.request_id)
+        self.collections[key] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), "")
+        command_duration.labels(event.command_name, collection).observe(
+            event.duration_micros / 1e6
+        )
+
+    def failed(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), "")
+        command_duration.labels(event.command_name, collection).observe(
+            event.duration_micros / 1e6
+        )
+        command_failures.labels(event.command_name, collection).inc()
+
+
+class PoolCollector:
+    # Reads the pool listener's counters at scrape time instead of on every event
+    def __init__(self, pool_stats):
+        self.pool_stats = pool_stats
+
+    def collect(self):
+        stats = self.pool_stats.stats()
+        yield GaugeMetricFamily(
+            "mongodb_pool_connections", "Open pool connections", stats["connections"]
+        )
+        yield GaugeMetricFamily(
+            "mongodb_pool_checked_out",
+            "Connections checked out of the pool",
+            stats["checked_out"],
+        )
+        yield CounterMetricFamily(
+            "mongodb_pool_checkouts", "Connection checkouts", stats["checkouts"]
+        )
+        yield CounterMetricFamily(
+            "mongodb_pool_checkout_failures",
+            "Connection checkouts that failed",
+            stats["checkout_failures"],
+        )
+        yield CounterMetricFamily(
+            "mongodb_pool_checkout_wait_seconds",
+            "Time spent waiting for a pool connection",
+            stats["checkout_wait_seconds_total"],
+        )
+        yield GaugeMetricFamily(
+            "mongodb_pool_checkout_wait_seconds_max",
+            "Longest wait for a pool connection",
+            stats["checkout_wait_seconds_max"],
+        )
+
+
+command_metrics = CommandMetrics()
+
+
+def register_pool_metrics(pool_stats):
+    REGISTRY.register(PoolCollector(pool_stats))
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,10 @@
-from typing import Annotated, Optional
+from enum import Enum
+from typing import Annotated, List, Optional
 
 from pydantic import BaseModel, BeforeValidator, Field
 
+from src.models.common import ObjectIdStr
+
 
 def book_count_validator(value: int) -> int:
     if value < 0:
@@ -18,7 +21,25 @@ class BookBase(BaseModel):
 
 
 class BookResponse(BookBase):
-    id: str = Field(alias="_id")
+    id: ObjectIdStr = Field(alias="_id")
+
+
+class BookPartialResponse(BaseModel):
+    id: ObjectIdStr = Field(alias="_id")
+    title: Optional[str] = None
+    author: Optional[str] = None
+    category: Optional[str] = None
+    total_count: Optional[int] = None
+    available_count: Optional[int] = None
+
+
+class BookSearchResponse(BookPartialResponse):
+    score: Optional[float] = None
+
+
+class BookBatchResponse(BaseModel):
+    items: List[BookPartialResponse]
+    missing: List[str]
 
 
 class BookCreate(BookBase):
@@ -31,3 +52,23 @@ class BookUpdate(BaseModel):
     category: Optional[str] = None
     total_count: Optional[Annotated[int, BeforeValidator(book_count_validator)]] = 0
     available_count: Optional[Annotated[int, BeforeValidator(book_count_validator)]] = 0
+
+
+class BookImportFormat(Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class BookImportError(BaseModel):
+    row: int
+    error: str
+
+
+class BookImportReport(BaseModel):
+    rows: int
+    inserted: int
+    failed: int
+    errors: List[BookImportError]
+    errors_truncated: bool
+    seconds: float
+    rows_per_second: float
@@ -0,0 +1,6 @@
+from typing import Annotated
+
+from pydantic import BeforeValidator
+
+# Accepts the ObjectId straight from MongoDB as well as its string form
+ObjectIdStr = Annotated[str, BeforeValidator(str)]
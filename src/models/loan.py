@@ -1,9 +1,11 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
+from src.models.common import ObjectIdStr
+
 
 class LoanStatus(Enum):
     PENDING = "PENDING"
@@ -22,9 +24,28 @@ class LoanBase(BaseModel):
 
 
 class LoanResponse(LoanBase):
-    id: str = Field(alias="_id")
+    id: ObjectIdStr = Field(alias="_id")
     date: datetime
     return_date: datetime
+    overdue: bool = False
+
+
+class LoanPartialResponse(BaseModel):
+    id: ObjectIdStr = Field(alias="_id")
+    username: Optional[str] = None
+    book_title: Optional[str] = None
+    status: Optional[LoanStatus] = None
+    date: Optional[datetime] = None
+    return_date: Optional[datetime] = None
+    overdue: Optional[bool] = None
+
+    class Config:
+        use_enum_values = True
+
+
+class LoanBatchResponse(BaseModel):
+    items: List[LoanPartialResponse]
+    missing: List[str]
 
 
 class LoanCreate(LoanBase):
@@ -36,6 +57,7 @@ class LoanUpdate(BaseModel):
     book_title: Optional[str] = None
     date: Optional[datetime] = None
     return_date: Optional[datetime] = None
+    overdue: Optional[bool] = None
     status: Optional[LoanStatus] = LoanStatus.PENDING
 
     class Config:
@@ -2,6 +2,7 @@ from datetime import datetime
 
 from pydantic import BaseModel, Field
 
+from src.models.common import ObjectIdStr
 from src.models.loan_return import LibrarianStatus
 
 
@@ -13,7 +14,7 @@ class LoanRenewalBase(BaseModel):
 
 
 class LoanRenewalResponse(LoanRenewalBase):
-    id: str = Field(alias="_id")
+    id: ObjectIdStr = Field(alias="_id")
     status: LibrarianStatus = LibrarianStatus.PENDING
     date: datetime
 
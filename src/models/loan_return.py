@@ -3,6 +3,8 @@ from enum import Enum
 
 from pydantic import BaseModel, Field
 
+from src.models.common import ObjectIdStr
+
 
 class LibrarianStatus(Enum):
     PENDING = "PENDING"
@@ -17,7 +19,7 @@ class LoanReturnBase(BaseModel):
 
 
 class LoanReturnResponse(LoanReturnBase):
-    id: str = Field(alias="_id")
+    id: ObjectIdStr = Field(alias="_id")
     status: LibrarianStatus = LibrarianStatus.PENDING
     date: datetime
 
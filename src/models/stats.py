@@ -0,0 +1,12 @@
+from datetime import datetime
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class CirculationStats(BaseModel):
+    loans: Dict[str, int]
+    overdue: int
+    returns: Dict[str, int]
+    renewals: Dict[str, int]
+    generated_at: datetime
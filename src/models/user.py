@@ -1,9 +1,11 @@
 from datetime import datetime
 from enum import Enum
-from typing import Annotated, Any, Optional
+from typing import Annotated, Any, List, Optional
 
 from pydantic import BaseModel, BeforeValidator, Field
 
+from src.models.common import ObjectIdStr
+
 
 class Role(Enum):
     ADMIN = "ADMIN"
@@ -21,10 +23,26 @@ class UserBase(BaseModel):
 
 
 class UserResponse(UserBase):
-    id: str = Field(alias="_id")
+    id: ObjectIdStr = Field(alias="_id")
     created_at: datetime
 
 
+class UserPartialResponse(BaseModel):
+    id: ObjectIdStr = Field(alias="_id")
+    username: Optional[str] = None
+    role: Optional[Role] = None
+    full_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        use_enum_values = True
+
+
+class UserBatchResponse(BaseModel):
+    items: List[UserPartialResponse]
+    missing: List[str]
+
+
 def password_validator(value: Any) -> Any:
     if len(value) < 8:
         raise ValueError("Password is short. it sould be at least 8 characters")
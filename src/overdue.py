@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+
+from src.crud.loan import CHECKED_OUT_STATUSES
+from src.database import close_mongo_connection, connect_to_mongo, get_database
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps, 0 turns the background sweeper off
+OVERDUE_SWEEP_INTERVAL = float(os.environ.get("OVERDUE_SWEEP_INTERVAL", "300"))
+OVERDUE_SWEEP_BATCH_SIZE = int(os.environ.get("OVERDUE_SWEEP_BATCH_SIZE", "500"))
+OVERDUE_SWEEP_MAX_BATCHES = int(os.environ.get("OVERDUE_SWEEP_MAX_BATCHES", "20"))
+
+WATERMARK_ID = "overdue_sweeper"
+
+
+async def _load_watermark(db):
+    watermark = await db.jobs.find_one({"_id": WATERMARK_ID})
+    if not watermark:
+        return None
+    return watermark["return_date"], watermark["loan_id"]
+
+
+async def _save_watermark(db, return_date: datetime, loan_id):
+    await db.jobs.update_one(
+        {"_id": WATERMARK_ID},
+        {
+            "$set": {
+                "return_date": return_date,
+                "loan_id": loan_id,
+                "updated_at": datetime.now(),
+            }
+        },
+        upsert=True,
+    )
+
+
+def _overdue_query(now: datetime, watermark) -> dict:
+    query = {"status": {"$in": CHECKED_OUT_STATUSES}, "return_date": {"$lt": now}}
+    if watermark:
+        return_date, loan_id = watermark
+        query["$or"] = [
+            {"return_date": {"$gt": return_date}},
+            {"return_date": return_date, "_id": {"$gt": loan_id}},
+        ]
+    return query
+
+
+async def sweep_overdue_loans(
+    db,
+    batch_size: int = OVERDUE_SWEEP_BATCH_SIZE,
+    max_batches: int = OVERDUE_SWEEP_MAX_BATCHES,
+) -> dict:
+    # Loans are visited in (return_date, _id) order from the last watermark, so
+    # a run only reads loans that became overdue since the previous one
+    started_at = time.perf_counter()
+    now = datetime.now()
+    watermark = await _load_watermark(db)
+    report = {"batches": 0, "scanned": 0, "flagged": 0}
+
+    while report["batches"] < max_batches:
+        loans = (
+            await db.loans.find(_overdue_query(now, watermark), {"return_date": 1})
+            .sort([("return_date", ASCENDING), ("_id", ASCENDING)])
+            .limit(batch_size)
+            .to_list(length=batch_size)
+        )
+        if not loans:
+            break
+
+        result = await db.loans.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": loan["_id"], "overdue": {"$ne": True}},
+                    {"$set": {"overdue": True}},
+                )
+                for loan in loans
+            ],
+            ordered=False,
+        )
+
+        watermark = loans[-1]["return_date"], loans[-1]["_id"]
+        await _save_watermark(db, *watermark)
+
+        report["batches"] += 1
+        report["scanned"] += len(loans)
+        report["flagged"] += result.modified_count
+        if len(loans) < batch_size:
+            break
+
+    report["seconds"] = round(time.perf_counter() - started_at, 3)
+    return report
+
+
+async def run_overdue_sweeper(db, interval: float = OVERDUE_SWEEP_INTERVAL):
+    while True:
+        try:
+            report = await sweep_overdue_loans(db)
+            if report["flagged"]:
+                logger.info("Overdue sweep: %s", report)
+        except Exception:
+            # Anything escaping here would end the sweeper for the process lifetime
+            logger.exception("Overdue sweep failed")
+        await asyncio.sleep(interval)
+
+
+async def _main(batch_size: int, max_batches: int):
+    await connect_to_mongo()
+    db = await get_database()
+    try:
+        print(json.dumps(await sweep_overdue_loans(db, batch_size, max_batches)))
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag overdue loans once")
+    parser.add_argument("--batch-size", type=int, default=OVERDUE_SWEEP_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=OVERDUE_SWEEP_MAX_BATCHES)
+    args = parser.parse_args()
+    asyncio.run(_main(args.batch_size, args.max_batches))
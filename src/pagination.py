@@ -0,0 +1,54 @@
+import base64
+import binascii
+import os
+from typing import Annotated, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Query, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "100"))
+
+PageSkip = Annotated[int, Query(ge=0)]
+PageLimit = Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)]
+
+
+def encode_cursor(id) -> str:
+    return base64.urlsafe_b64encode(ObjectId(id).binary).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return ObjectId(base64.urlsafe_b64decode(padded))
+
+
+def cursor_query(cursor: Optional[str] = None) -> Optional[ObjectId]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def paginate(
+    collection,
+    query: dict,
+    skip: int,
+    limit: int,
+    after: Optional[ObjectId] = None,
+    projection: Optional[dict] = None,
+):
+    if after is not None:
+        query = {**query, "_id": {"$gt": after}}
+        skip = 0
+    return collection.find(query, projection).sort("_id", 1).skip(skip).limit(limit)
+
+
+def next_cursor_headers(items: list, limit: int) -> Optional[dict]:
+    if items and len(items) == limit:
+        return {NEXT_CURSOR_HEADER: encode_cursor(items[-1]["_id"])}
+    return None
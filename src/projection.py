@@ -0,0 +1,30 @@
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, status
+
+USER_PUBLIC_PROJECTION = {"password": 0}
+
+
+def fields_query(allowed: Iterable[str]):
+    allowed = frozenset(allowed)
+
+    def fields_projection(fields: Optional[str] = None) -> Optional[dict]:
+        if not fields:
+            return None
+
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = sorted(set(requested) - allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unknown fields: " + ", ".join(unknown),
+            )
+        return {field: 1 for field in requested}
+
+    return fields_projection
+
+
+def select_fields(document: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return document
+    return {k: v for k, v in document.items() if k == "_id" or k in projection}
@@ -0,0 +1,61 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from src.admission import admission_controller
+from src.auth import get_current_user, password_hasher
+from src.crud.book import book_cache, book_title_cache
+from src.crud.catalog import catalog_version_cache
+from src.crud.stats import stats_cache
+from src.crud.user import user_cache
+from src.database import get_database, pool_stats
+from src.indexes import index_report
+from src.models.user import Role
+from src.slow_queries import SLOW_QUERY_BUFFER_SIZE, slow_query_recorder
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/indexes")
+async def admin_index_report_route(
+    user_data=Depends(get_current_user), db=Depends(get_database)
+):
+    if Role(user_data["role"]) != Role.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see the index report",
+        )
+    return await index_report(db)
+
+
+@router.get("/slow_queries")
+async def admin_slow_queries_route(
+    limit: Annotated[int, Query(ge=1, le=SLOW_QUERY_BUFFER_SIZE)] = 50,
+    user_data=Depends(get_current_user),
+):
+    if Role(user_data["role"]) != Role.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see the slow query log",
+        )
+    return {**slow_query_recorder.stats(), "entries": slow_query_recorder.recent(limit)}
+
+
+@router.get("/stats")
+async def admin_stats_route(user_data=Depends(get_current_user)):
+    if Role(user_data["role"]) != Role.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can see the service stats",
+        )
+    return {
+        "book_cache": book_cache.stats(),
+        "book_title_cache": book_title_cache.stats(),
+        "catalog_version_cache": catalog_version_cache.stats(),
+        "circulation_cache": stats_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "user_cache": user_cache.stats(),
+        "mongo_pool": pool_stats.stats(),
+        "slow_queries": slow_query_recorder.stats(),
+        "admission": admission_controller.stats(),
+    }
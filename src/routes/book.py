@@ -1,40 +1,133 @@
+import io
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from bson import ObjectId
+from fastapi import (APIRouter, Depends, HTTPException, Request, Response,
+                     UploadFile, status)
 
 from src.auth import get_current_user
+from src.batch import BatchRequest, ordered_batch
+from src.book_import import MissingUniqueIndex, guess_format, import_books
+from src.conditional import catalog_validators
 from src.crud.book import (check_book_uniqueness, create_book, delete_book,
-                           get_book_by_id, get_books, search_book, update_book)
-from src.database import get_database
-from src.models.book import BookCreate, BookResponse, BookUpdate
+                           get_book_by_id, get_books, get_books_by_ids,
+                           search_book, search_book_ranked, stream_books,
+                           update_book)
+from src.database import get_catalog_database, get_database
+from src.export import EXPORT_BATCH_SIZE, ExportBatchSize, ndjson_response
+from src.models.book import (BookBase, BookBatchResponse, BookCreate,
+                             BookImportFormat, BookImportReport,
+                             BookPartialResponse, BookResponse,
+                             BookSearchResponse, BookUpdate)
 from src.models.user import Role
+from src.pagination import (PageLimit, PageSkip, cursor_query,
+                            next_cursor_headers)
+from src.projection import fields_query, select_fields
+from src.serialization import ListSerializer
 
 router = APIRouter(prefix="/book", tags=["book"])
 
+book_fields = fields_query(BookBase.model_fields)
+book_list = ListSerializer(BookPartialResponse, exclude_unset=True)
+book_search_list = ListSerializer(BookSearchResponse, exclude_unset=True)
 
-@router.get("/book/{id}", response_model=List[BookResponse])
-async def book_get_by_id_route(id: str, db=Depends(get_database)):
-    book = await get_book_by_id(id, db)
-    return book
 
+@router.get(
+    "/book/{id}",
+    response_model=BookPartialResponse,
+    response_model_exclude_unset=True,
+)
+async def book_get_by_id_route(
+    id: str,
+    request: Request,
+    response: Response,
+    projection: Optional[dict] = Depends(book_fields),
+    validators: dict = Depends(catalog_validators),
+    db=Depends(get_catalog_database),
+):
+    catalog_version = getattr(request.state, "catalog_version", None)
+    book = await get_book_by_id(id, db, catalog_version)
+
+    if not book:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Book not found"
+        )
+    response.headers.update(validators)
+    return select_fields(book, projection)
+
+
+@router.post(
+    "/batch", response_model=BookBatchResponse, response_model_exclude_unset=True
+)
+async def book_batch_route(
+    batch: BatchRequest,
+    projection: Optional[dict] = Depends(book_fields),
+    db=Depends(get_catalog_database),
+):
+    books = await get_books_by_ids(batch.ids, db)
+    result = ordered_batch(batch.ids, books)
+    result["items"] = [select_fields(book, projection) for book in result["items"]]
+    return result
 
-@router.get("/search", response_model=List[BookResponse])
+
+@router.get(
+    "/search",
+    response_model=List[BookSearchResponse],
+    response_model_exclude_unset=True,
+)
 async def book_search_route(
+    q: Optional[str] = None,
     title: Optional[str] = None,
     author: Optional[str] = None,
     category: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 10,
-    db=Depends(get_database),
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
+    after: Optional[ObjectId] = Depends(cursor_query),
+    projection: Optional[dict] = Depends(book_fields),
+    validators: dict = Depends(catalog_validators),
+    db=Depends(get_catalog_database),
+):
+    if q:
+        books = await search_book_ranked(db, q, skip, limit, projection)
+        return book_search_list.render(books, validators)
+
+    books = await search_book(
+        db, skip, limit, title, author, category, after, projection
+    )
+    headers = next_cursor_headers(books, limit) or {}
+    return book_search_list.render(books, {**validators, **headers})
+
+
+@router.get(
+    "/list",
+    response_model=List[BookPartialResponse],
+    response_model_exclude_unset=True,
+)
+async def book_list_route(
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
+    after: Optional[ObjectId] = Depends(cursor_query),
+    projection: Optional[dict] = Depends(book_fields),
+    validators: dict = Depends(catalog_validators),
+    db=Depends(get_catalog_database),
 ):
-    books = await search_book(db, skip, limit, title, author, category)
-    return books
+    books = await get_books(db, skip, limit, after, projection)
+    headers = next_cursor_headers(books, limit) or {}
+    return book_list.render(books, {**validators, **headers})
 
 
-@router.get("/list", response_model=List[BookResponse])
-async def book_list_route(skip: int = 0, limit: int = 10, db=Depends(get_database)):
-    books = await get_books(db, skip, limit)
-    return books
+@router.get("/export")
+async def book_export_route(
+    batch_size: ExportBatchSize = EXPORT_BATCH_SIZE,
+    user_data=Depends(get_current_user),
+    db=Depends(get_catalog_database),
+):
+    if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and librarians can export books",
+        )
+    return ndjson_response(stream_books(db, batch_size), batch_size, "books.ndjson")
 
 
 @router.post("/", response_model=BookResponse)
@@ -56,6 +149,42 @@ async def book_create_route(
     )
 
 
+@router.post("/import", response_model=BookImportReport)
+async def book_import_route(
+    file: UploadFile,
+    format: Optional[BookImportFormat] = None,
+    user_data=Depends(get_current_user),
+    db=Depends(get_database),
+):
+    if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins and librarians can import books",
+        )
+
+    format = format or guess_format(file.filename)
+    if format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not guess the file format, pass format=csv or ndjson",
+        )
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        return await import_books(stream, format, db)
+    except MissingUniqueIndex as error:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(error)
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The file must be UTF-8 encoded",
+        )
+    finally:
+        stream.detach()
+
+
 @router.put("/book/{id}", response_model=BookResponse)
 async def book_update_route(
     id: str,
@@ -1,25 +1,46 @@
-from datetime import datetime, timedelta
 from typing import List, Optional
 
+from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from src.auth import get_current_user
-from src.crud.book import get_book_by_title, update_book
-from src.crud.loan import (create_loan, delete_loan, existing_loan,
-                           get_book_loans, get_loan, get_loans, get_user_loans,
-                           update_loan)
+from src.batch import BatchRequest, ordered_batch
+from src.crud.book import checkin_book, checkout_book, get_book_by_title
+from src.crud.catalog import mark_catalog_changed
+from src.crud.loan import (approve_loan, create_loan, delete_loan,
+                           get_book_loans, get_loan, get_loans,
+                           get_loans_by_ids, get_user_loans, stream_loans)
+from src.crud.loan_summary import (add_summary_loan, get_loan_summary,
+                                   remove_summary_loan, set_summary_loan,
+                                   summary_loans)
 from src.crud.user import get_user_by_username
-from src.database import get_database
-from src.models.book import BookUpdate
-from src.models.loan import LoanCreate, LoanResponse, LoanStatus, LoanUpdate
+from src.database import get_database, transaction
+from src.export import EXPORT_BATCH_SIZE, ExportBatchSize, ndjson_response
+from src.models.loan import (LoanBase, LoanBatchResponse, LoanCreate,
+                             LoanPartialResponse, LoanResponse, LoanStatus)
 from src.models.user import Role
+from src.pagination import (PageLimit, PageSkip, cursor_query,
+                            next_cursor_headers)
+from src.projection import fields_query, select_fields
+from src.serialization import ListSerializer
 
 router = APIRouter(prefix="/loan", tags=["loan"])
 
+loan_fields = fields_query(
+    [*LoanBase.model_fields, "date", "return_date", "overdue"]
+)
+loan_list = ListSerializer(LoanPartialResponse, exclude_unset=True)
 
-@router.get("/id/{id}", response_model=LoanResponse)
-async def loan_get_by_id_route(id: str, db=Depends(get_database)):
-    loan = await get_loan(id, db)
+
+@router.get(
+    "/id/{id}", response_model=LoanPartialResponse, response_model_exclude_unset=True
+)
+async def loan_get_by_id_route(
+    id: str,
+    projection: Optional[dict] = Depends(loan_fields),
+    db=Depends(get_database),
+):
+    loan = await get_loan(id, db, projection)
 
     if not loan:
         raise HTTPException(
@@ -28,6 +49,24 @@ async def loan_get_by_id_route(id: str, db=Depends(get_database)):
     return loan
 
 
+@router.post(
+    "/batch", response_model=LoanBatchResponse, response_model_exclude_unset=True
+)
+async def loan_batch_route(
+    batch: BatchRequest,
+    projection: Optional[dict] = Depends(loan_fields),
+    user_data=Depends(get_current_user),
+    db=Depends(get_database),
+):
+    # Members only get their own loans, anything else is reported as missing
+    username = None
+    if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
+        username = user_data["sub"]
+
+    loans = await get_loans_by_ids(batch.ids, db, username, projection)
+    return ordered_batch(batch.ids, loans)
+
+
 @router.put("/approve/{id}", response_model=LoanResponse)
 async def loan_approve_route(
     id: str, user_data=Depends(get_current_user), db=Depends(get_database)
@@ -38,36 +77,49 @@ async def loan_approve_route(
             detail="You can't approve loan requests as a member",
         )
 
-    loan = await get_loan(id, db)
+    loan = await get_loan(id, db, {"book_title": 1, "status": 1})
     if not loan:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found"
         )
-
-    book = await get_book_by_title(loan["book_title"], db)
-    available_books = book["available_count"]
-
-    if available_books == 0:
+    if LoanStatus(loan["status"]) != LoanStatus.PENDING:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="There is no available book in library",
+            detail="This loan is not waiting for approval",
         )
 
-    await update_book(
-        book["_id"],
-        BookUpdate(
-            available_count=available_books - 1, total_count=book["total_count"]
-        ),
-        db,
-    )
+    async with transaction(db) as session:
+        book = await checkout_book(loan["book_title"], db, session)
+        if not book:
+            if not await get_book_by_title(loan["book_title"], db):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="No such book found",
+                )
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="There is no available book in library",
+            )
 
-    loan["status"] = LoanStatus.APPROVED
-    now = datetime.now()
-    loan["date"] = now
-    loan["return_date"] = now + timedelta(days=14)
+        approved_loan = await approve_loan(id, db, session)
+        if not approved_loan:
+            # Approved by someone else since the read above
+            if session is None:
+                await checkin_book(loan["book_title"], db)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This loan is not waiting for approval",
+            )
 
-    approved_loan = await update_loan(id, LoanUpdate(**loan), db)
+        await set_summary_loan(
+            approved_loan["username"],
+            id,
+            {k: approved_loan[k] for k in ("status", "date", "return_date")},
+            db,
+            session,
+        )
 
+    mark_catalog_changed(db)
     return approved_loan
 
 
@@ -76,21 +128,22 @@ async def loan_create_route(
     loan_data: LoanCreate, user_data=Depends(get_current_user), db=Depends(get_database)
 ):
     loan = loan_data.model_dump()
+    staff = Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]
 
     if Role(user_data["role"]) == Role.MEMBER:
         loan["username"] = user_data["sub"]
         loan["status"] = LoanStatus.PENDING
-    elif Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
+    elif staff:
         loan["status"] = LoanStatus.APPROVED
 
-        user = get_user_by_username(loan["username"], db)
+        user = await get_user_by_username(loan["username"], db, {"_id": 1})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
 
-    existing = await existing_loan(loan["username"], loan["book_title"], db)
-    if existing and LoanStatus(existing["status"]) != LoanStatus.RETURNED:
+    summary = await get_loan_summary(loan["username"], db)
+    if loan["book_title"] in summary["titles"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You already loaned this book",
@@ -102,82 +155,153 @@ async def loan_create_route(
             status_code=status.HTTP_404_NOT_FOUND, detail="No such book found"
         )
 
-    if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        available_books = book["available_count"]
-
-        if available_books == 0:
+    async with transaction(db) as session:
+        if staff and not await checkout_book(loan["book_title"], db, session):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="There is no available book in library",
             )
 
-        await update_book(
-            book["_id"],
-            BookUpdate(
-                available_count=available_books - 1, total_count=book["total_count"]
-            ),
-            db,
-        )
+        new_loan = await create_loan(LoanCreate(**loan), db, session)
 
-    new_loan = await create_loan(LoanCreate(**loan), db)
+        # The summary update only applies if no concurrent request added the
+        # same title after the check above
+        if not await add_summary_loan(new_loan, db, session):
+            if session is None:
+                await delete_loan(new_loan["_id"], db)
+                if staff:
+                    await checkin_book(loan["book_title"], db)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="You already loaned this book",
+            )
 
-    new_loan["_id"] = str(new_loan["_id"])
+    if staff:
+        mark_catalog_changed(db)
     return new_loan
 
 
-@router.get("/my_loans", response_model=List[LoanResponse])
+@router.get(
+    "/my_loans",
+    response_model=List[LoanPartialResponse],
+    response_model_exclude_unset=True,
+)
 async def loan_user_list_route(
     user_data=Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    history: bool = False,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
+    after: Optional[ObjectId] = Depends(cursor_query),
+    projection: Optional[dict] = Depends(loan_fields),
     db=Depends(get_database),
 ):
-    return await get_user_loans(db, user_data["sub"], skip, limit)
+    # Returned loans are only in the loans collection, so history pages it
+    if history:
+        loans = await get_user_loans(
+            db, user_data["sub"], skip, limit, after, projection
+        )
+        return loan_list.render(loans, next_cursor_headers(loans, limit))
+
+    # Current loans come whole from the summary and are paged here, in the same
+    # _id order and with the same cursor as the history pages
+    summary = await get_loan_summary(user_data["sub"], db)
+    loans = sorted(summary_loans(summary), key=lambda loan: loan["_id"])
+    if after is not None:
+        loans = [loan for loan in loans if loan["_id"] > after]
+        skip = 0
+    loans = loans[skip:skip + limit]
+    return loan_list.render(
+        [select_fields(loan, projection) for loan in loans],
+        next_cursor_headers(loans, limit),
+    )
 
 
-@router.get("/book/{book_title}", response_model=List[LoanResponse])
+@router.get(
+    "/book/{book_title}",
+    response_model=List[LoanPartialResponse],
+    response_model_exclude_unset=True,
+)
 async def loan_book_list_route(
     book_title: str,
     user_data=Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
+    after: Optional[ObjectId] = Depends(cursor_query),
+    projection: Optional[dict] = Depends(loan_fields),
     db=Depends(get_database),
 ):
     if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        return await get_book_loans(db, book_title, skip, limit)
+        loans = await get_book_loans(db, book_title, skip, limit, after, projection)
+        return loan_list.render(loans, next_cursor_headers(loans, limit))
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You can't see a book loans as a member",
     )
 
 
-@router.get("/list", response_model=List[LoanResponse])
+@router.get(
+    "/list",
+    response_model=List[LoanPartialResponse],
+    response_model_exclude_unset=True,
+)
 async def loan_list_route(
     user_data=Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
     loan_status: Optional[LoanStatus] = None,
+    after: Optional[ObjectId] = Depends(cursor_query),
+    projection: Optional[dict] = Depends(loan_fields),
     db=Depends(get_database),
 ):
     if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        return await get_loans(db, skip, limit, status=loan_status)
+        loans = await get_loans(
+            db, skip, limit, status=loan_status, after=after, projection=projection
+        )
+        return loan_list.render(loans, next_cursor_headers(loans, limit))
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You can't see loans list as a member",
     )
 
 
+@router.get("/export")
+async def loan_export_route(
+    batch_size: ExportBatchSize = EXPORT_BATCH_SIZE,
+    loan_status: Optional[LoanStatus] = None,
+    user_data=Depends(get_current_user),
+    db=Depends(get_database),
+):
+    if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can't export loans as a member",
+        )
+    return ndjson_response(
+        stream_loans(db, batch_size, status=loan_status), batch_size, "loans.ndjson"
+    )
+
+
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def loan_delete_route(
     id: str, user_data=Depends(get_current_user), db=Depends(get_database)
 ):
     if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        deleted_loan = await delete_loan(id, db)
-
-        if not deleted_loan:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="No such loan exists"
-            )
+        async with transaction(db) as session:
+            deleted_loan = await delete_loan(id, db, session)
+
+            if not deleted_loan:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="No such loan exists",
+                )
+            if LoanStatus(deleted_loan["status"]) != LoanStatus.RETURNED:
+                await remove_summary_loan(
+                    deleted_loan["username"],
+                    id,
+                    deleted_loan["book_title"],
+                    db,
+                    session,
+                )
         return
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
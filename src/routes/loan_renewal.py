@@ -1,22 +1,28 @@
-from datetime import timedelta
 from typing import List, Optional
 
+from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
+from pymongo.errors import DuplicateKeyError
 
 from src.auth import get_current_user
-from src.crud.loan import get_loan, update_loan
-from src.crud.loan_renewal import (create_loan_renewal, delete_loan_renewal,
-                                   existing_loan_renewal, get_loan_id_renewals,
-                                   get_loan_renewal, get_loan_renewals,
-                                   update_loan_renewal)
-from src.database import get_database
-from src.models.loan import LoanStatus, LoanUpdate
+from src.crud.loan import get_loan, renew_loan, request_loan_renewal
+from src.crud.loan_renewal import (approve_loan_renewal, create_loan_renewal,
+                                   delete_loan_renewal, get_loan_id_renewals,
+                                   get_loan_renewal, get_loan_renewals)
+from src.crud.loan_summary import set_summary_loan
+from src.database import get_database, transaction
+from src.models.loan import LoanStatus
 from src.models.loan_renewal import (LibrarianStatus, LoanRenewalCreate,
                                      LoanRenewalResponse)
 from src.models.user import Role
+from src.pagination import (PageLimit, PageSkip, cursor_query,
+                            next_cursor_headers)
+from src.serialization import ListSerializer
 
 router = APIRouter(prefix="/loan_renewal", tags=["loan_renewal"])
 
+loan_renewal_list = ListSerializer(LoanRenewalResponse)
+
 
 @router.get("/id/{id}", response_model=LoanRenewalResponse)
 async def loan_renewal_get_by_id_route(
@@ -54,57 +60,71 @@ async def loan_renewal_create_route(
     user_data=Depends(get_current_user),
     db=Depends(get_database),
 ):
-    loan_renewal = loan_renewal_data.model_dump()
-
-    loan = await get_loan(loan_renewal["loan_id"], db)
-    if not loan:
+    loan_id = loan_renewal_data.loan_id
+    if not ObjectId.is_valid(loan_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found"
         )
 
-    if Role(user_data["role"]) == Role.MEMBER:
-        if loan["username"] != user_data["sub"]:
+    staff = Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]
+    async with transaction(db) as session:
+        # The unique loan_id index rejects a second renewal of the same loan
+        try:
+            new_loan_renewal = await create_loan_renewal(
+                loan_renewal_data,
+                LibrarianStatus.APPROVED if staff else LibrarianStatus.PENDING,
+                db,
+                session=session,
+            )
+        except DuplicateKeyError:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You can't request renewal of other users loans",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This loan renewal already exists",
             )
 
-        if LoanStatus(loan["status"]) != LoanStatus.APPROVED:
+        if staff:
+            renewed = await renew_loan(loan_id, db, session)
+            if renewed:
+                await set_summary_loan(
+                    renewed["username"],
+                    loan_id,
+                    {k: renewed[k] for k in ("status", "return_date")},
+                    db,
+                    session,
+                )
+        else:
+            renewed = await request_loan_renewal(
+                loan_id, user_data["sub"], db, session
+            )
+            if renewed:
+                await set_summary_loan(
+                    user_data["sub"],
+                    loan_id,
+                    {"status": LoanStatus.RENEW_PENDING.value},
+                    db,
+                    session,
+                )
+
+        if not renewed:
+            # Without a transaction nothing rolls the insert back
+            if session is None:
+                await delete_loan_renewal(new_loan_renewal["_id"], db)
+
+            loan = await get_loan(loan_id, db)
+            if not loan:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found"
+                )
+            if not staff and loan["username"] != user_data["sub"]:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="You can't request renewal of other users loans",
+                )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="You can only renew approved loans",
             )
 
-    existing = await existing_loan_renewal(loan_renewal["loan_id"], db)
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="This loan renewal already exists",
-        )
-
-    if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        loan_renewal_status = LibrarianStatus.APPROVED
-
-        await update_loan(
-            loan_renewal["loan_id"], LoanUpdate(status=LoanStatus.APPROVED), db
-        )
-
-        new_return_date = loan["return_date"] + timedelta(days=14)
-        await update_loan(
-            loan_renewal["loan_id"], LoanUpdate(return_date=new_return_date), db
-        )
-    else:
-        loan_renewal_status = LibrarianStatus.PENDING
-
-        await update_loan(
-            loan_renewal["loan_id"], LoanUpdate(status=LoanStatus.RENEW_PENDING), db
-        )
-
-    new_loan_renewal = await create_loan_renewal(
-        LoanRenewalCreate(**loan_renewal), loan_renewal_status, db
-    )
-
-    new_loan_renewal["_id"] = str(new_loan_renewal["_id"])
     return new_loan_renewal
 
 
@@ -118,44 +138,46 @@ async def loan_renewal_approve_route(
             detail="You can't approve loan renewal requests as a member",
         )
 
-    loan_renewal = await get_loan_renewal(id, db)
-    if loan_renewal is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Loan renewal request not found",
-        )
-
-    if LibrarianStatus(loan_renewal["status"]) == LibrarianStatus.APPROVED:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="This renewal request already approved",
-        )
-
-    await update_loan_renewal(db, id, LibrarianStatus.APPROVED)
-
-    loan = await get_loan(loan_renewal["loan_id"], db)
-    new_return_date = loan["return_date"] + timedelta(days=14)
+    async with transaction(db) as session:
+        loan_renewal = await approve_loan_renewal(id, db, session)
+        if not loan_renewal:
+            if await get_loan_renewal(id, db) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Loan renewal request not found",
+                )
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This renewal request already approved",
+            )
 
-    await update_loan(
-        loan_renewal["loan_id"],
-        LoanUpdate(status=LoanStatus.APPROVED, return_date=new_return_date),
-        db,
-    )
+        loan = await renew_loan(loan_renewal["loan_id"], db, session)
+        if loan:
+            await set_summary_loan(
+                loan["username"],
+                loan_renewal["loan_id"],
+                {k: loan[k] for k in ("status", "return_date")},
+                db,
+                session,
+            )
 
-    new_loan_renewal = await get_loan_renewal(id, db)
-    return new_loan_renewal
+    return loan_renewal
 
 
 @router.get("/loan/{loan_id}", response_model=List[LoanRenewalResponse])
 async def loan_renewal_loan_list_route(
     loan_id: str,
     user_data=Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
+    after: Optional[ObjectId] = Depends(cursor_query),
     db=Depends(get_database),
 ):
     if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        return await get_loan_id_renewals(db, loan_id, skip, limit)
+        loan_renewals = await get_loan_id_renewals(db, loan_id, skip, limit, after)
+        return loan_renewal_list.render(
+            loan_renewals, next_cursor_headers(loan_renewals, limit)
+        )
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You can't see a loan renewals as a member",
@@ -165,13 +187,19 @@ async def loan_renewal_loan_list_route(
 @router.get("/list", response_model=List[LoanRenewalResponse])
 async def loan_renewal_list_route(
     user_data=Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
     librarian_status: Optional[LibrarianStatus] = None,
+    after: Optional[ObjectId] = Depends(cursor_query),
     db=Depends(get_database),
 ):
     if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        return await get_loan_renewals(db, skip, limit, status=librarian_status)
+        loan_renewals = await get_loan_renewals(
+            db, skip, limit, status=librarian_status, after=after
+        )
+        return loan_renewal_list.render(
+            loan_renewals, next_cursor_headers(loan_renewals, limit)
+        )
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You can't see loan renewals list as a member",
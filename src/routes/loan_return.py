@@ -1,24 +1,29 @@
-from datetime import datetime
 from typing import List, Optional
 
+from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from src.auth import get_current_user
-from src.crud.book import get_book_by_title, update_book
-from src.crud.loan import get_loan, update_loan
-from src.crud.loan_return import (create_loan_return, delete_loan_return,
-                                  existing_loan_return, get_loan_id_returns,
-                                  get_loan_return, get_loan_returns,
-                                  update_loan_return)
-from src.database import get_database
-from src.models.book import BookUpdate
-from src.models.loan import LoanStatus, LoanUpdate
+from src.crud.book import checkin_book
+from src.crud.catalog import mark_catalog_changed
+from src.crud.loan import get_loan, return_loan
+from src.crud.loan_return import (approve_loan_return, create_loan_return,
+                                  delete_loan_return, get_loan_id_returns,
+                                  get_loan_return, get_loan_returns)
+from src.crud.loan_summary import remove_summary_loan
+from src.database import get_database, transaction
+from src.models.loan import LoanStatus
 from src.models.loan_return import (LibrarianStatus, LoanReturnCreate,
                                     LoanReturnResponse)
 from src.models.user import Role
+from src.pagination import (PageLimit, PageSkip, cursor_query,
+                            next_cursor_headers)
+from src.serialization import ListSerializer
 
 router = APIRouter(prefix="/loan_return", tags=["loan_return"])
 
+loan_return_list = ListSerializer(LoanReturnResponse)
+
 
 @router.get("/id/{id}", response_model=LoanReturnResponse)
 async def loan_return_get_by_id_route(
@@ -50,46 +55,61 @@ async def loan_return_create_route(
     user_data=Depends(get_current_user),
     db=Depends(get_database),
 ):
-    loan_return = loan_return_data.model_dump()
-
-    existing = await existing_loan_return(loan_return["loan_id"], db)
-    if existing:
+    loan_id = loan_return_data.loan_id
+    if not ObjectId.is_valid(loan_id):
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="This loan return already exists",
+            status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found"
         )
 
-    loan = await update_loan(
-        loan_return["loan_id"], LoanUpdate(status=LoanStatus.RETURNED), db
-    )
-    if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        loan_return_status = LibrarianStatus.APPROVED
-
-        book = await get_book_by_title(loan["book_title"], db)
-        await update_book(
-            book["_id"],
-            BookUpdate(
-                available_count=book["available_count"] + 1,
-                total_count=book["total_count"],
-            ),
-            db,
+    staff = Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]
+    async with transaction(db) as session:
+        # Only a checked out loan can be returned, so a second return of the
+        # same loan fails here instead of needing a separate lookup
+        loan = await return_loan(
+            loan_id, db, None if staff else user_data["sub"], session
         )
-    else:
-        if loan["username"] != user_data["sub"]:
+        if not loan:
+            loan = await get_loan(loan_id, db)
+            if not loan:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found"
+                )
+            if not staff and loan["username"] != user_data["sub"]:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="You can't request return of other users loans",
+                )
+            if LoanStatus(loan["status"]) == LoanStatus.RETURNED:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="This loan return already exists",
+                )
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You can't request return of other users loans",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="You can only return approved loans",
             )
-        loan_return_status = LibrarianStatus.PENDING
 
-    loan_return["date"] = datetime.now()
-    loan_return["status"] = LibrarianStatus.PENDING
-    new_loan_return = await create_loan_return(
-        LoanReturnCreate(**loan_return), loan_return_status, db
-    )
+        await remove_summary_loan(
+            loan["username"], loan_id, loan["book_title"], db, session
+        )
 
-    new_loan_return["_id"] = str(new_loan_return["_id"])
-    return new_loan_return
+        if staff:
+            loan_return_status = LibrarianStatus.APPROVED
+            await checkin_book(loan["book_title"], db, session)
+        else:
+            loan_return_status = LibrarianStatus.PENDING
+
+        loan_return = await create_loan_return(
+            loan_return_data,
+            loan_return_status,
+            db,
+            book_title=loan["book_title"],
+            session=session,
+        )
+
+    if staff:
+        mark_catalog_changed(db)
+    return loan_return
 
 
 @router.post("/approve/{id}", response_model=LoanReturnResponse)
@@ -102,45 +122,45 @@ async def loan_return_approve_route(
             detail="You can't approve loan return requests as a member",
         )
 
-    loan_return = await get_loan_return(id, db)
-    if loan_return is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Loan return request not found",
-        )
-
-    if LibrarianStatus(loan_return["status"]) == LibrarianStatus.APPROVED:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="This return request already approved",
-        )
+    async with transaction(db) as session:
+        loan_return = await approve_loan_return(id, db, session)
+        if not loan_return:
+            if await get_loan_return(id, db) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Loan return request not found",
+                )
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This return request already approved",
+            )
 
-    await update_loan_return(db, id, LibrarianStatus.APPROVED)
+        # Requests made before the book title was stored on them
+        book_title = loan_return.get("book_title")
+        if not book_title:
+            loan = await get_loan(loan_return["loan_id"], db, session=session)
+            book_title = loan["book_title"]
 
-    loan = await get_loan(loan_return["loan_id"], db)
-    book = await get_book_by_title(loan["book_title"], db)
-    await update_book(
-        book["_id"],
-        BookUpdate(
-            available_count=book["available_count"] + 1, total_count=book["total_count"]
-        ),
-        db,
-    )
+        await checkin_book(book_title, db, session)
 
-    new_loan_return = await get_loan_return(id, db)
-    return new_loan_return
+    mark_catalog_changed(db)
+    return loan_return
 
 
 @router.get("/loan/{loan_id}", response_model=List[LoanReturnResponse])
 async def loan_return_loan_list_route(
     loan_id: str,
     user_data=Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
+    after: Optional[ObjectId] = Depends(cursor_query),
     db=Depends(get_database),
 ):
     if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        return await get_loan_id_returns(db, loan_id, skip, limit)
+        loan_returns = await get_loan_id_returns(db, loan_id, skip, limit, after)
+        return loan_return_list.render(
+            loan_returns, next_cursor_headers(loan_returns, limit)
+        )
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You can't see a loan returns as a member",
@@ -150,13 +170,19 @@ async def loan_return_loan_list_route(
 @router.get("/list", response_model=List[LoanReturnResponse])
 async def loan_return_list_route(
     user_data=Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
     librarian_status: Optional[LibrarianStatus] = LibrarianStatus.PENDING,
+    after: Optional[ObjectId] = Depends(cursor_query),
     db=Depends(get_database),
 ):
     if Role(user_data["role"]) in [Role.ADMIN, Role.LIBRARIAN]:
-        return await get_loan_returns(db, skip, limit, status=librarian_status)
+        loan_returns = await get_loan_returns(
+            db, skip, limit, status=librarian_status, after=after
+        )
+        return loan_return_list.render(
+            loan_returns, next_cursor_headers(loan_returns, limit)
+        )
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You can't see loan returns list as a member",
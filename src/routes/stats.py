@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from src.auth import get_current_user
+from src.crud.stats import get_circulation_stats
+from src.database import get_database
+from src.models.stats import CirculationStats
+from src.models.user import Role
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/circulation", response_model=CirculationStats)
+async def stats_circulation_route(
+    user_data=Depends(get_current_user), db=Depends(get_database)
+):
+    if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can't see circulation stats as a member",
+        )
+    return await get_circulation_stats(db)
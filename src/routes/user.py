@@ -1,16 +1,27 @@
-from typing import List
+from typing import List, Optional
 
+from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from src.auth import get_current_user, hash_password
+from src.batch import BatchRequest, ordered_batch
 from src.crud.user import (check_username_exists, create_user, delete_user,
                            get_user_by_id, get_user_by_username, get_users,
-                           update_user)
+                           get_users_by_ids, stream_users, update_user)
 from src.database import get_database
-from src.models.user import Role, UserCreate, UserResponse, UserUpdate
+from src.export import EXPORT_BATCH_SIZE, ExportBatchSize, ndjson_response
+from src.models.user import (Role, UserBase, UserBatchResponse, UserCreate,
+                             UserPartialResponse, UserResponse, UserUpdate)
+from src.pagination import (PageLimit, PageSkip, cursor_query,
+                            next_cursor_headers)
+from src.projection import USER_PUBLIC_PROJECTION, fields_query
+from src.serialization import ListSerializer
 
 router = APIRouter(prefix="/user", tags=["user"])
 
+user_fields = fields_query([*UserBase.model_fields, "created_at"])
+user_list = ListSerializer(UserPartialResponse, exclude_unset=True)
+
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def user_create_route(
@@ -23,47 +34,85 @@ async def user_create_route(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this username already exists",
             )
-        return await create_user(user, hash_password(user.password), db)
+        return await create_user(user, await hash_password(user.password), db)
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="You cannot create a user as a member",
     )
 
 
-@router.get("/id/{user_id}", response_model=UserResponse)
+@router.get(
+    "/id/{id}", response_model=UserPartialResponse, response_model_exclude_unset=True
+)
 async def user_get_by_id_route(
-    id: str, user_data=Depends(get_current_user), db=Depends(get_database)
+    id: str,
+    projection: Optional[dict] = Depends(user_fields),
+    user_data=Depends(get_current_user),
+    db=Depends(get_database),
 ):
     if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can't see users as a member",
         )
-    user = await get_user_by_id(id, db)
+    user = await get_user_by_id(id, db, projection or USER_PUBLIC_PROJECTION)
     if user:
         return user
     raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
 
 
-@router.get("/username/{username}", response_model=UserResponse)
+@router.post(
+    "/batch", response_model=UserBatchResponse, response_model_exclude_unset=True
+)
+async def user_batch_route(
+    batch: BatchRequest,
+    projection: Optional[dict] = Depends(user_fields),
+    user_data=Depends(get_current_user),
+    db=Depends(get_database),
+):
+    if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can't see users as a member",
+        )
+    users = await get_users_by_ids(batch.ids, db, projection or USER_PUBLIC_PROJECTION)
+    return ordered_batch(batch.ids, users)
+
+
+@router.get(
+    "/username/{username}",
+    response_model=UserPartialResponse,
+    response_model_exclude_unset=True,
+)
 async def user_get_by_username(
-    username: str, user_data=Depends(get_current_user), db=Depends(get_database)
+    username: str,
+    projection: Optional[dict] = Depends(user_fields),
+    user_data=Depends(get_current_user),
+    db=Depends(get_database),
 ):
     if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can't see users as a member",
         )
-    user = await get_user_by_username(username, db)
+    user = await get_user_by_username(
+        username, db, projection or USER_PUBLIC_PROJECTION
+    )
     if user:
         return user
     raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
 
 
-@router.get("/list", response_model=List[UserResponse])
+@router.get(
+    "/list",
+    response_model=List[UserPartialResponse],
+    response_model_exclude_unset=True,
+)
 async def user_list_route(
-    skip: int = 0,
-    limit: int = 10,
+    skip: PageSkip = 0,
+    limit: PageLimit = 10,
+    after: Optional[ObjectId] = Depends(cursor_query),
+    projection: Optional[dict] = Depends(user_fields),
     user_data=Depends(get_current_user),
     db=Depends(get_database),
 ):
@@ -73,8 +122,24 @@ async def user_list_route(
             detail="You can't see list of users as a member",
         )
 
-    users_list = await get_users(db, skip, limit)
-    return users_list
+    users_list = await get_users(
+        db, skip, limit, after, projection or USER_PUBLIC_PROJECTION
+    )
+    return user_list.render(users_list, next_cursor_headers(users_list, limit))
+
+
+@router.get("/export")
+async def user_export_route(
+    batch_size: ExportBatchSize = EXPORT_BATCH_SIZE,
+    user_data=Depends(get_current_user),
+    db=Depends(get_database),
+):
+    if Role(user_data["role"]) not in [Role.ADMIN, Role.LIBRARIAN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can't export users as a member",
+        )
+    return ndjson_response(stream_users(db, batch_size), batch_size, "users.ndjson")
 
 
 @router.put("/{username}", response_model=UserResponse)
@@ -93,6 +158,9 @@ async def user_update_route(
                     detail="User with this username already exists",
                 )
 
+        if user.password:
+            user.password = await hash_password(user.password)
+
         return await update_user(id, user, db)
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN, detail="You can't edit other users info"
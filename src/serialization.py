@@ -0,0 +1,57 @@
+import os
+from enum import Enum
+from typing import List, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from pydantic import TypeAdapter
+
+# Documents read from MongoDB already have the shape of the response models, so
+# list routes render them directly instead of validating them a second time
+TRUSTED_DB_SERIALIZATION = (
+    os.environ.get("TRUSTED_DB_SERIALIZATION", "true").lower() == "true"
+)
+
+
+def encode_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, default=encode_default)
+
+
+class ListSerializer:
+    def __init__(
+        self,
+        model,
+        exclude_unset: bool = False,
+        trusted: bool = TRUSTED_DB_SERIALIZATION,
+    ):
+        self.adapter = TypeAdapter(List[model])
+        self.fields = frozenset(
+            field.alias or name for name, field in model.model_fields.items()
+        )
+        self.exclude_unset = exclude_unset
+        self.trusted = trusted
+
+    def dump(self, documents: list) -> bytes:
+        if self.trusted:
+            fields = self.fields
+            return dumps(
+                [{k: v for k, v in d.items() if k in fields} for d in documents]
+            )
+        items = self.adapter.validate_python(documents)
+        return self.adapter.dump_json(
+            items, by_alias=True, exclude_unset=self.exclude_unset
+        )
+
+    def render(self, documents: list, headers: Optional[dict] = None) -> Response:
+        return Response(
+            self.dump(documents), media_type="application/json", headers=headers
+        )
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import random
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+# Commands slower than this are recorded, 0 (the default) turns the recorder off
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "0"))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+SLOW_QUERY_BUFFER_SIZE = int(os.environ.get("SLOW_QUERY_BUFFER_SIZE", "200"))
+SLOW_QUERY_ENABLED = SLOW_QUERY_THRESHOLD_MS > 0
+# Explains run against the same server, so only a few at a time
+MAX_CONCURRENT_EXPLAINS = 2
+
+EXPLAINABLE = {
+    "find",
+    "aggregate",
+    "count",
+    "distinct",
+    "findAndModify",
+    "update",
+    "delete",
+}
+# Session and transaction fields that can't be sent again inside an explain
+UNEXPLAINABLE_FIELDS = {
+    "lsid",
+    "txnNumber",
+    "startTransaction",
+    "autocommit",
+    "readConcern",
+    "writeConcern",
+}
+
+# Scope of the request being handled; Motor copies the context into the thread
+# that runs the command, and the router fills in scope["route"] before any query
+request_scope = ContextVar("request_scope", default=None)
+
+
+def redact(value):
+    # Keeps field names and operators, replaces every value with "?"
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return [redact(v) for v in value]
+    return "?"
+
+
+def command_shape(name: str, command: dict) -> dict:
+    if name == "find":
+        shape = {"filter": redact(command.get("filter", {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if name == "aggregate":
+        return {"pipeline": redact(command.get("pipeline", []))}
+    if name in ("findAndModify", "count", "distinct"):
+        return {"filter": redact(command.get("query", {}))}
+    if name in ("update", "delete"):
+        statements = command.get(name + "s", [])
+        return {
+            "filter": redact(statements[0].get("q", {})) if statements else {},
+            "statements": len(statements),
+        }
+    if name == "insert":
+        return {"documents": len(command.get("documents", []))}
+    return {}
+
+
+def plan_summary(explained: dict) -> dict:
+    stages = []
+    stage = explained.get("queryPlanner", {}).get("winningPlan", {})
+    # Aggregations nest the find plan under queryPlanner.winningPlan.queryPlan
+    stage = stage.get("queryPlan", stage)
+    while stage:
+        stages.append(
+            " ".join(filter(None, [stage.get("stage"), stage.get("indexName")]))
+        )
+        stage = stage.get("inputStage")
+
+    stats = explained.get("executionStats", {})
+    return {
+        "stages": stages,
+        "returned": stats.get("nReturned"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+class RouteContextMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
+
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        explain_sample: float = SLOW_QUERY_EXPLAIN_SAMPLE,
+        size: int = SLOW_QUERY_BUFFER_SIZE,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample = explain_sample
+        self.entries = deque(maxlen=size)
+        # (connection, request id) -> (command, route) until the reply arrives
+        self.pending = {}
+        self.explain_slots = threading.BoundedSemaphore(MAX_CONCURRENT_EXPLAINS)
+        self.db = None
+        self.loop = None
+
+    def start(self, db):
+        # Explains are scheduled on the app's loop from the driver's threads
+        self.db = db
+        self.loop = asyncio.get_running_loop()
+
+    def started(self, event):
+        if event.command_name == "explain":
+            return
+        scope = request_scope.get()
+        route = getattr(scope.get("route"), "path", None) if scope else None
+        key = (event.connection_id, event.request_id)
+        self.pending[key] = (event.command, route)
+
+    def succeeded(self, event):
+        self._finished(event, None)
+
+    def failed(self, event):
+        self._finished(event, str(event.failure.get("errmsg", event.failure)))
+
+    def _finished(self, event, error):
+        pending = self.pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+
+        command, route = pending
+        name = event.command_name
+        collection = command.get(name)
+        entry = {
+            "at": datetime.now(),
+            "duration_ms": round(duration_ms, 3),
+            "command": name,
+            "collection": collection if isinstance(collection, str) else None,
+            "route": route,
+            "shape": command_shape(name, command),
+            "error": error,
+            "plan": None,
+        }
+        self.entries.append(entry)
+
+        if (
+            name in EXPLAINABLE
+            and self.loop
+            and random.random() < self.explain_sample
+            and self.explain_slots.acquire(blocking=False)
+        ):
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    self._explain(entry, command), self.loop
+                )
+            except RuntimeError:
+                # The loop is closed, the app is shutting down
+                self.explain_slots.release()
+
+    async def _explain(self, entry: dict, command: dict):
+        explainable = {
+            k: v
+            for k, v in command.items()
+            if not k.startswith("$") and k not in UNEXPLAINABLE_FIELDS
+        }
+        try:
+            explained = await self.db.command(
+                {"explain": explainable, "verbosity": "executionStats"}
+            )
+            entry["plan"] = plan_summary(explained)
+        except PyMongoError as error:
+            entry["plan"] = {"error": str(error)}
+        finally:
+            self.explain_slots.release()
+
+    def recent(self, limit: int) -> list:
+        return list(self.entries)[::-1][:limit]
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_sample": self.explain_sample,
+            "recorded": len(self.entries),
+        }
+
+
+slow_query_recorder = SlowQueryRecorder()
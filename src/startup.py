@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from src.auth import ensure_admin_user
+from src.database import close_mongo_connection, connect_to_mongo, get_database
+from src.indexes import ensure_indexes
+
+logger = logging.getLogger(__name__)
+
+# How long a process may hold the bootstrap lease before another one takes over;
+# renewed after every phase, so it only has to cover the longest one
+STARTUP_LOCK_TTL = float(os.environ.get("STARTUP_LOCK_TTL", "120"))
+
+LOCK_ID = "startup_lock"
+VERSION_ID = "startup_version"
+
+# Data migrations, in order: (version, name, coroutine taking db). The version
+# document records the last one applied, so each runs once per database
+MIGRATIONS = []
+
+# Bump when INDEXES change, so running deployments create them on the next start
+STARTUP_VERSION = max([1] + [version for version, _, _ in MIGRATIONS])
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+@contextlib.contextmanager
+def timed(phase: str):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        logger.info(
+            "Startup phase %s took %.1f ms",
+            phase,
+            (time.perf_counter() - started_at) * 1000,
+        )
+
+
+async def _acquire_lease(db) -> bool:
+    now = datetime.now()
+    try:
+        await db.jobs.find_one_and_update(
+            {
+                "_id": LOCK_ID,
+                "$or": [{"expires_at": {"$lt": now}}, {"owner": OWNER}],
+            },
+            {
+                "$set": {
+                    "owner": OWNER,
+                    "expires_at": now + timedelta(seconds=STARTUP_LOCK_TTL),
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The lease exists, is not expired and belongs to someone else
+        return False
+    return True
+
+
+async def _release_lease(db):
+    await db.jobs.delete_one({"_id": LOCK_ID, "owner": OWNER})
+
+
+async def _load_version(db) -> dict:
+    return await db.jobs.find_one({"_id": VERSION_ID}) or {"version": 0}
+
+
+def _is_current(version: dict) -> bool:
+    return (
+        version["version"] >= STARTUP_VERSION
+        and version.get("admin_username") == os.environ["ADMIN_USERNAME"]
+    )
+
+
+async def _renew_lease(db, phase: str) -> bool:
+    # Past STARTUP_LOCK_TTL another process may have taken over; writing the
+    # version now could mark its half-done bootstrap as complete
+    if await _acquire_lease(db):
+        return True
+    logger.warning("Startup lease lost after %s, aborting the bootstrap", phase)
+    return False
+
+
+async def _bootstrap(db, version: dict) -> bool:
+    with timed("indexes"):
+        failed = await ensure_indexes(db)
+    if not await _renew_lease(db, "indexes"):
+        return False
+
+    with timed("admin"):
+        await ensure_admin_user(db)
+    if not await _renew_lease(db, "admin"):
+        return False
+
+    for migration_version, name, migrate in MIGRATIONS:
+        if migration_version <= version["version"]:
+            continue
+        with timed(f"migration {migration_version} {name}"):
+            await migrate(db)
+        if not await _renew_lease(db, f"migration {migration_version} {name}"):
+            return False
+        await db.jobs.update_one(
+            {"_id": VERSION_ID},
+            {"$set": {"version": migration_version}},
+            upsert=True,
+        )
+
+    # Failed index builds are retried by the next process that starts
+    if failed:
+        return True
+    await db.jobs.update_one(
+        {"_id": VERSION_ID},
+        {
+            "$set": {
+                "version": STARTUP_VERSION,
+                "admin_username": os.environ["ADMIN_USERNAME"],
+                "completed_at": datetime.now(),
+                "completed_by": OWNER,
+            }
+        },
+        upsert=True,
+    )
+    return True
+
+
+async def run_startup(db, force: bool = False) -> str:
+    with timed("bootstrap"):
+        version = await _load_version(db)
+        if _is_current(version) and not force:
+            logger.info("Startup bootstrap is at version %s", version["version"])
+            return "current"
+
+        if not await _acquire_lease(db):
+            logger.info("Another process is running the startup bootstrap")
+            return "skipped"
+
+        try:
+            # Someone may have finished between the first read and the lease
+            version = await _load_version(db)
+            if _is_current(version) and not force:
+                return "current"
+            if not await _bootstrap(db, version):
+                return "lost"
+        finally:
+            await _release_lease(db)
+        return "done"
+
+
+async def _main(force: bool):
+    await connect_to_mongo()
+    db = await get_database()
+    try:
+        print(await run_startup(db, force))
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Create indexes, the admin user and apply data migrations"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="run even if the version is current"
+    )
+    asyncio.run(_main(parser.parse_args().force))
@@ -0,0 +1,1045 @@
+import heapq
+import operator
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from bson import ObjectId
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import (
+    DeleteMany,
+    DeleteOne,
+    InsertOne,
+    ReplaceOne,
+    UpdateMany,
+    UpdateOne,
+)
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+# In-process stand-in for the part of the Motor API the CRUD layer uses:
+# find/find_one with sort, skip, limit and projections, the single and bulk
+# writes, update pipelines, aggregate ($match, $group, $facet, $count, $sort,
+# $skip, $limit, $project), $text search and explain. Documents live in a dict
+# keyed by _id; every declared index keeps a hash of its first field's values,
+# which answers equality and $in lookups, and unique indexes are enforced.
+
+_MISSING = object()
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple((k, _hashable(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+# MongoDB's comparison order between types
+_BRACKETS = {
+    type(None): 0,
+    int: 1,
+    float: 1,
+    str: 2,
+    dict: 3,
+    list: 4,
+    ObjectId: 7,
+    bool: 8,
+    datetime: 9,
+}
+
+
+def _bracket(value) -> int:
+    return _BRACKETS.get(type(value), 10)
+
+
+def _sort_key(value):
+    bracket = _BRACKETS.get(type(value), 10)
+    if bracket == 7:
+        # bytes compare in C, ObjectId.__lt__ doesn't
+        return (7, value.binary)
+    if bracket in (0, 3, 4, 10):
+        return (bracket, 0)
+    return (bracket, value)
+
+
+def _sort_key_for(value, descending: bool):
+    # As a sort key an array stands for its smallest element ascending and its
+    # largest descending; an empty one sorts before null
+    if isinstance(value, list):
+        if not value:
+            return (-1, 0)
+        return (max if descending else min)(_sort_key(v) for v in value)
+    return _sort_key(value)
+
+
+def _get(document, path: str):
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _field(document, path: str):
+    if "." not in path:
+        return document.get(path)
+    value = _get(document, path)
+    return None if value is _MISSING else value
+
+
+def _values(value, parts: list) -> list:
+    # Every value a query path can match, arrays matching as a whole and by element
+    if not parts:
+        return [value, *value] if isinstance(value, list) else [value]
+    if isinstance(value, list):
+        if parts[0].isdigit() and int(parts[0]) < len(value):
+            return _values(value[int(parts[0])], parts[1:])
+        return [v for item in value for v in _values(item, parts)]
+    if isinstance(value, dict) and parts[0] in value:
+        return _values(value[parts[0]], parts[1:])
+    return []
+
+
+def _is_operator(condition) -> bool:
+    return (
+        isinstance(condition, dict)
+        and bool(condition)
+        and next(iter(condition)).startswith("$")
+    )
+
+
+@lru_cache(maxsize=256)
+def _regex(pattern: str, options: str):
+    flags = 0
+    for option, flag in (("i", re.I), ("m", re.M), ("s", re.S), ("x", re.X)):
+        if option in options:
+            flags |= flag
+    return re.compile(pattern, flags)
+
+
+def _compare(compare):
+    def match(values, operand):
+        bracket = _bracket(operand)
+        return any(_bracket(v) == bracket and compare(v, operand) for v in values)
+
+    return match
+
+
+_COMPARISONS = {
+    "$gt": _compare(operator.gt),
+    "$gte": _compare(operator.ge),
+    "$lt": _compare(operator.lt),
+    "$lte": _compare(operator.le),
+}
+
+
+def _match_operator(op: str, operand, values: list, present: bool, condition) -> bool:
+    if op == "$eq":
+        return operand in values
+    if op == "$ne":
+        return operand not in values
+    if op == "$in":
+        return any(v in values for v in operand)
+    if op == "$nin":
+        return not any(v in values for v in operand)
+    if op in _COMPARISONS:
+        return _COMPARISONS[op](values, operand)
+    if op == "$exists":
+        return present == bool(operand)
+    if op == "$regex":
+        pattern = _regex(operand, condition.get("$options", ""))
+        return any(isinstance(v, str) and pattern.search(v) for v in values)
+    if op == "$options":
+        return True
+    if op == "$not":
+        return not _match_condition(values, present, operand)
+    if op == "$elemMatch":
+        return any(isinstance(v, dict) and _matches(v, operand) for v in values)
+    if op == "$size":
+        return any(isinstance(v, list) and len(v) == operand for v in values)
+    raise OperationFailure(f"unknown operator: {op}")
+
+
+def _match_condition(values: list, present: bool, condition) -> bool:
+    if _is_operator(condition):
+        return all(
+            _match_operator(op, operand, values, present, condition)
+            for op, operand in condition.items()
+        )
+    return condition in values
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, q) for q in condition):
+                return False
+        elif key == "$and":
+            if not all(_matches(document, q) for q in condition):
+                return False
+        elif key == "$nor":
+            if any(_matches(document, q) for q in condition):
+                return False
+        elif key == "$text":
+            # Answered by the collection's text index
+            continue
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}")
+        else:
+            values = _values(document, key.split("."))
+            if not _match_condition(values or [None], bool(values), condition):
+                return False
+    return True
+
+
+def _project(document: dict, projection, score=None) -> dict:
+    if not projection:
+        return _copy(document)
+
+    fields = {k: v for k, v in projection.items() if not isinstance(v, dict)}
+    if any(v for k, v in fields.items() if k != "_id"):
+        projected = {
+            k: _copy(v)
+            for k, v in document.items()
+            if fields.get(k) or (k == "_id" and fields.get("_id", 1))
+        }
+    else:
+        projected = {k: _copy(v) for k, v in document.items() if fields.get(k, 1)}
+
+    for k, v in projection.items():
+        if isinstance(v, dict) and v.get("$meta") == "textScore":
+            projected[k] = score
+    return projected
+
+
+def _sort_spec(key_or_list, direction=None) -> list:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+def _sorted(documents, spec: list, scores=None, limit: int = 0) -> list:
+    scores = scores or {}
+
+    def field_key(field, direction):
+        if isinstance(direction, dict):
+            # {"$meta": "textScore"}, best match first
+            return lambda d: scores.get(d["_id"], 0)
+        return lambda d: _sort_key_for(_field(d, field), direction < 0)
+
+    keys = [(field_key(f, d), isinstance(d, dict) or d < 0) for f, d in spec]
+    if limit and len({reverse for _, reverse in keys}) == 1:
+        select = heapq.nlargest if keys[0][1] else heapq.nsmallest
+        return select(limit, documents, key=lambda d: tuple(k(d) for k, _ in keys))
+
+    documents = list(documents)
+    for key, reverse in reversed(keys):
+        documents.sort(key=key, reverse=reverse)
+    return documents[:limit] if limit else documents
+
+
+def _parent(document: dict, path: str):
+    parts = path.split(".")
+    target = document
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            target = target[int(part)]
+        else:
+            target = target.setdefault(part, {})
+    last = parts[-1]
+    return target, int(last) if isinstance(target, list) else last
+
+
+def _positional(path: str, document: dict, query: dict) -> str:
+    if ".$" not in path:
+        return path
+
+    array_path, rest = path.split(".$", 1)
+    prefix = array_path + "."
+    conditions = {k[len(prefix) :]: v for k, v in query.items() if k.startswith(prefix)}
+    for index, item in enumerate(_get(document, array_path) or []):
+        if array_path in query and not _match_condition(
+            [item], True, query[array_path]
+        ):
+            continue
+        if conditions and not (isinstance(item, dict) and _matches(item, conditions)):
+            continue
+        if array_path in query or conditions:
+            return f"{array_path}.{index}{rest}"
+    raise OperationFailure(
+        "The positional operator did not find the match needed from the query."
+    )
+
+
+def _each(value) -> list:
+    if isinstance(value, dict) and "$each" in value:
+        return value["$each"]
+    return [value]
+
+
+def _set(container, key, value):
+    container[key] = _copy(value)
+
+
+def _unset(container, key, value):
+    if isinstance(container, list):
+        container[key] = None
+    else:
+        container.pop(key, None)
+
+
+def _inc(container, key, value):
+    current = container[key] if isinstance(container, list) else container.get(key)
+    container[key] = (current or 0) + value
+
+
+def _push(container, key, value):
+    container.setdefault(key, []).extend(_copy(v) for v in _each(value))
+
+
+def _add_to_set(container, key, value):
+    items = container.setdefault(key, [])
+    items.extend(_copy(v) for v in _each(value) if v not in items)
+
+
+def _pull(container, key, value):
+    if key not in container:
+        return
+    if isinstance(value, dict) and not _is_operator(value):
+        keep = [
+            i
+            for i in container[key]
+            if not (isinstance(i, dict) and _matches(i, value))
+        ]
+    else:
+        keep = [i for i in container[key] if not _match_condition([i], True, value)]
+    container[key] = keep
+
+
+_UPDATE_OPERATORS = {
+    "$set": _set,
+    "$setOnInsert": _set,
+    "$unset": _unset,
+    "$inc": _inc,
+    "$push": _push,
+    "$addToSet": _add_to_set,
+    "$pull": _pull,
+}
+
+
+def _add(*values):
+    if any(v is None for v in values):
+        return None
+    date = next((v for v in values if isinstance(v, datetime)), None)
+    total = sum(v for v in values if not isinstance(v, datetime))
+    return total if date is None else date + timedelta(milliseconds=total)
+
+
+def _expression_compare(compare):
+    return lambda a, b: compare(_sort_key(a), _sort_key(b))
+
+
+_EXPRESSIONS = {
+    "$add": _add,
+    "$eq": _expression_compare(operator.eq),
+    "$ne": _expression_compare(operator.ne),
+    "$gt": _expression_compare(operator.gt),
+    "$gte": _expression_compare(operator.ge),
+    "$lt": _expression_compare(operator.lt),
+    "$lte": _expression_compare(operator.le),
+    "$ifNull": lambda value, default: default if value is None else value,
+}
+
+
+def _expression(document: dict, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _field(document, expression[1:])
+    if _is_operator(expression):
+        (op, args), *_ = expression.items()
+        if op == "$literal":
+            return args
+        if op not in _EXPRESSIONS:
+            raise OperationFailure(f"Unrecognized expression '{op}'")
+        args = args if isinstance(args, list) else [args]
+        return _EXPRESSIONS[op](*(_expression(document, a) for a in args))
+    if isinstance(expression, dict):
+        return {k: _expression(document, v) for k, v in expression.items()}
+    if isinstance(expression, list):
+        return [_expression(document, v) for v in expression]
+    return expression
+
+
+def _apply_pipeline(document: dict, pipeline: list):
+    for stage in pipeline:
+        (name, spec), *_ = stage.items()
+        if name in ("$set", "$addFields"):
+            values = {k: _expression(document, v) for k, v in spec.items()}
+            for path, value in values.items():
+                container, key = _parent(document, path)
+                container[key] = value
+        elif name == "$unset":
+            for path in [spec] if isinstance(spec, str) else spec:
+                _unset(*_parent(document, path), None)
+        else:
+            raise OperationFailure(f"{name} is not allowed in an update pipeline")
+
+
+def _apply_update(document: dict, update, query: dict, inserting: bool = False):
+    if isinstance(update, list):
+        _apply_pipeline(document, update)
+        return
+
+    for op, fields in update.items():
+        if op not in _UPDATE_OPERATORS:
+            raise OperationFailure(f"Unknown modifier: {op}")
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            container, key = _parent(document, _positional(path, document, query))
+            _UPDATE_OPERATORS[op](container, key, value)
+
+
+def _upsert_document(query: dict) -> dict:
+    document = {}
+    for key, condition in query.items():
+        if key.startswith("$") or _is_operator(condition):
+            continue
+        container, last = _parent(document, key)
+        container[last] = _copy(condition)
+    return document
+
+
+def _group(documents: list, spec: dict) -> list:
+    groups = {}
+    for document in documents:
+        key = _expression(document, spec["_id"])
+        group = groups.setdefault(_hashable(key), {"_id": key, "values": {}})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expression), *_ = accumulator.items()
+            group["values"].setdefault(field, (op, []))[1].append(
+                _expression(document, expression)
+            )
+
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        for field, (op, values) in group["values"].items():
+            numbers = [v for v in values if _bracket(v) == 1]
+            present = [v for v in values if v is not None]
+            if op == "$sum":
+                result[field] = sum(numbers)
+            elif op == "$avg":
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif op == "$min":
+                result[field] = min(present, key=_sort_key, default=None)
+            elif op == "$max":
+                result[field] = max(present, key=_sort_key, default=None)
+            elif op == "$first":
+                result[field] = values[0]
+            elif op == "$last":
+                result[field] = values[-1]
+            elif op == "$push":
+                result[field] = values
+            else:
+                raise OperationFailure(f"unknown group operator '{op}'")
+        results.append(result)
+    return results
+
+
+def _aggregate(documents: list, pipeline: list) -> list:
+    for stage in pipeline:
+        (name, spec), *_ = stage.items()
+        if name == "$match":
+            documents = [d for d in documents if _matches(d, spec)]
+        elif name == "$group":
+            documents = _group(documents, spec)
+        elif name == "$facet":
+            documents = [
+                {field: _aggregate(documents, sub) for field, sub in spec.items()}
+            ]
+        elif name == "$count":
+            documents = [{spec: len(documents)}] if documents else []
+        elif name == "$sort":
+            documents = _sorted(documents, _sort_spec(spec))
+        elif name == "$skip":
+            documents = documents[spec:]
+        elif name == "$limit":
+            documents = documents[:spec]
+        elif name == "$project":
+            documents = [_project(d, spec) for d in documents]
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'")
+    return documents
+
+
+def _tokens(text) -> list:
+    return re.findall(r"\w+", text.lower()) if isinstance(text, str) else []
+
+
+def _text_score(text, terms: set) -> float:
+    # The server's per-field score without stemming or stop words: each repeat
+    # of a term adds half as much as the one before, a term weighs more in a
+    # short field, and a field that is exactly the term gets 10% on top
+    tokens = _tokens(text)
+    score = 0
+    for term, count in Counter(tokens).items():
+        if term not in terms:
+            continue
+        frequency = sum(1 / 2**repeat for repeat in range(count))
+        coefficient = 0.5 * count / len(tokens) + 0.5
+        adjustment = 1.1 if text.lower() == term else 1
+        score += frequency * coefficient * adjustment
+    return score
+
+
+class _Index:
+    def __init__(self, name: str, fields: list, unique: bool = False):
+        self.name = name
+        self.fields = fields
+        self.unique = unique
+        # first field value -> ids (an insertion ordered set)
+        self.entries = {}
+        # unique indexes: full key -> id
+        self.keys = {}
+
+    def _key(self, document: dict):
+        return tuple(_hashable(_field(document, f)) for f in self.fields)
+
+    def _lookup_values(self, document: dict):
+        values = _values(document, self.fields[0].split(".")) or [None]
+        return dict.fromkeys(_hashable(v) for v in values)
+
+    def check(self, document: dict):
+        if not self.unique:
+            return
+        owner = self.keys.get(self._key(document), document["_id"])
+        if owner != document["_id"]:
+            key = dict(zip(self.fields, self._key(document)))
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error index: {self.name} dup key: {key}",
+                11000,
+                {"code": 11000, "keyPattern": dict.fromkeys(self.fields, 1)},
+            )
+
+    def add(self, document: dict):
+        for value in self._lookup_values(document):
+            self.entries.setdefault(value, {})[document["_id"]] = None
+        if self.unique:
+            self.keys[self._key(document)] = document["_id"]
+
+    def remove(self, document: dict):
+        for value in self._lookup_values(document):
+            ids = self.entries.get(value)
+            if ids is not None:
+                ids.pop(document["_id"], None)
+                if not ids:
+                    del self.entries[value]
+        if self.unique:
+            self.keys.pop(self._key(document), None)
+
+    def lookup(self, condition):
+        if _is_operator(condition):
+            if set(condition) - {"$in", "$eq"}:
+                return None
+            values = condition.get("$in", []) + (
+                [condition["$eq"]] if "$eq" in condition else []
+            )
+        else:
+            values = [condition]
+        ids = {}
+        for value in values:
+            if isinstance(value, re.Pattern):
+                return None
+            ids.update(self.entries.get(_hashable(value), {}))
+        return ids
+
+
+class _TextIndex:
+    def __init__(self, name: str, weights: dict):
+        self.name = name
+        self.weights = weights
+
+    def score(self, document: dict, terms: set) -> float:
+        return sum(
+            weight * _text_score(_get(document, field), terms)
+            for field, weight in self.weights.items()
+        )
+
+
+class MemoryCursor:
+    def __init__(self, collection, query: dict, projection=None):
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self.sort_spec = []
+        self.skip_count = 0
+        self.limit_count = 0
+
+    def sort(self, key_or_list, direction=None):
+        self.sort_spec = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int):
+        self.skip_count = skip
+        return self
+
+    def limit(self, limit: int):
+        self.limit_count = limit
+        return self
+
+    def batch_size(self, batch_size: int):
+        return self
+
+    def _results(self) -> list:
+        documents, scores = self.collection._find(self.query)
+        if self.sort_spec:
+            wanted = self.skip_count + self.limit_count if self.limit_count else 0
+            documents = _sorted(documents, self.sort_spec, scores, wanted)
+        end = self.skip_count + self.limit_count if self.limit_count else None
+        return [
+            _project(d, self.projection, scores.get(d["_id"]))
+            for d in documents[self.skip_count : end]
+        ]
+
+    async def to_list(self, length=None):
+        results = self._results()
+        return results[:length] if length else results
+
+    async def _iterate(self):
+        for document in self._results():
+            yield document
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class MemoryCommandCursor:
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents[:length] if length else self.documents
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class MemoryCollection:
+    def __init__(self, database, name: str):
+        self.database = database
+        self.name = name
+        self.documents = {}
+        self.indexes = {}
+        self.text_index = None
+
+    def _plan(self, query: dict):
+        # (index name, candidate ids); no index means a scan of every document
+        if "_id" in query:
+            condition = query["_id"]
+            if not _is_operator(condition):
+                return "_id_", [condition]
+            if set(condition) <= {"$in", "$eq"}:
+                return "_id_", condition.get("$in", []) + (
+                    [condition["$eq"]] if "$eq" in condition else []
+                )
+        for index in self.indexes.values():
+            if index.fields[0] in query:
+                ids = index.lookup(query[index.fields[0]])
+                if ids is not None:
+                    return index.name, ids
+        return None, None
+
+    def _find(self, query: dict):
+        query = query or {}
+        scores = {}
+        if "$text" in query:
+            if not self.text_index:
+                raise OperationFailure("text index required for $text query")
+            terms = set(_tokens(query["$text"]["$search"]))
+            for id, document in self.documents.items():
+                score = self.text_index.score(document, terms)
+                if score:
+                    scores[id] = score
+            candidates = [self.documents[id] for id in scores]
+        else:
+            _, ids = self._plan(query)
+            if ids is None:
+                candidates = self.documents.values()
+            else:
+                candidates = [self.documents[i] for i in ids if i in self.documents]
+        if not query:
+            return list(candidates), scores
+        return [d for d in candidates if _matches(d, query)], scores
+
+    def _find_one(self, query: dict, sort=None):
+        documents, _ = self._find(query)
+        if sort:
+            documents = _sorted(documents, _sort_spec(sort), limit=1)
+        return documents[0] if documents else None
+
+    def _store(self, document: dict, previous=None):
+        for index in self.indexes.values():
+            index.check(document)
+        for index in self.indexes.values():
+            if previous is not None:
+                index.remove(previous)
+            index.add(document)
+        self.documents[document["_id"]] = document
+
+    def _insert(self, document: dict):
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error index: _id_ dup key: {document['_id']}",
+                11000,
+                {"code": 11000, "keyPattern": {"_id": 1}},
+            )
+        self._store(_copy(document))
+
+    def _update(self, query: dict, update, upsert=False, many=False, sort=None):
+        # -> (before, after) pairs and the upserted id
+        query = query or {}
+        if many:
+            targets, _ = self._find(query)
+        else:
+            target = self._find_one(query, sort)
+            targets = [target] if target else []
+
+        if not targets:
+            if not upsert:
+                return [], None
+            document = _upsert_document(query)
+            if _is_operator(update) or isinstance(update, list):
+                _apply_update(document, update, query, inserting=True)
+            else:
+                document = {**_copy(update), "_id": document.get("_id", ObjectId())}
+            self._insert(document)
+            return [(None, self.documents[document["_id"]])], document["_id"]
+
+        changes = []
+        for before in targets:
+            if _is_operator(update) or isinstance(update, list):
+                after = _copy(before)
+                _apply_update(after, update, query)
+            else:
+                after = {"_id": before["_id"], **_copy(update)}
+            if after.get("_id") != before["_id"]:
+                raise OperationFailure("Performing an update on the path '_id'")
+            if after != before:
+                self._store(after, before)
+            changes.append((before, after))
+        return changes, None
+
+    def _update_result(self, changes: list, upserted_id) -> UpdateResult:
+        raw = {
+            "n": len(changes),
+            "nModified": sum(
+                1 for before, after in changes if before not in (None, after)
+            ),
+        }
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    def _delete(self, query: dict, many=False, sort=None) -> list:
+        if many:
+            targets, _ = self._find(query or {})
+        else:
+            target = self._find_one(query or {}, sort)
+            targets = [target] if target else []
+        for document in targets:
+            for index in self.indexes.values():
+                index.remove(document)
+            del self.documents[document["_id"]]
+        return targets
+
+    def find(self, filter=None, projection=None, session=None, **kwargs):
+        cursor = MemoryCursor(self, filter or {}, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        return cursor.skip(kwargs.get("skip", 0)).limit(kwargs.get("limit", 0))
+
+    async def find_one(self, filter=None, projection=None, session=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        results = await self.find(filter, projection, **kwargs).limit(1).to_list(1)
+        return results[0] if results else None
+
+    async def count_documents(self, filter=None, session=None, **kwargs):
+        return len(self._find(filter or {})[0])
+
+    async def estimated_document_count(self, **kwargs):
+        return len(self.documents)
+
+    async def insert_one(self, document: dict, session=None, **kwargs):
+        self._insert(document)
+        return InsertOneResult(document["_id"], True)
+
+    async def insert_many(self, documents, ordered=True, session=None, **kwargs):
+        inserted_ids, errors = [], []
+        for i, document in enumerate(documents):
+            try:
+                self._insert(document)
+                inserted_ids.append(document["_id"])
+            except DuplicateKeyError as error:
+                errors.append({"index": i, "code": 11000, "errmsg": str(error)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(
+                {
+                    "writeErrors": errors,
+                    "writeConcernErrors": [],
+                    "nInserted": len(inserted_ids),
+                    "nUpserted": 0,
+                    "nMatched": 0,
+                    "nModified": 0,
+                    "nRemoved": 0,
+                    "upserted": [],
+                }
+            )
+        return InsertManyResult(inserted_ids, True)
+
+    async def update_one(self, filter, update, upsert=False, session=None, **kwargs):
+        changes, upserted_id = self._update(
+            filter, update, upsert, sort=kwargs.get("sort")
+        )
+        return self._update_result(changes, upserted_id)
+
+    async def update_many(self, filter, update, upsert=False, session=None, **kwargs):
+        changes, upserted_id = self._update(filter, update, upsert, many=True)
+        return self._update_result(changes, upserted_id)
+
+    async def replace_one(
+        self, filter, replacement, upsert=False, session=None, **kwargs
+    ):
+        if _is_operator(replacement):
+            raise ValueError("replacement can not include $ operators")
+        changes, upserted_id = self._update(filter, replacement, upsert)
+        return self._update_result(changes, upserted_id)
+
+    async def find_one_and_update(
+        self,
+        filter,
+        update,
+        projection=None,
+        sort=None,
+        upsert=False,
+        return_document=ReturnDocument.BEFORE,
+        session=None,
+        **kwargs,
+    ):
+        changes, _ = self._update(filter, update, upsert, sort=sort)
+        if not changes:
+            return None
+        before, after = changes[0]
+        document = after if return_document == ReturnDocument.AFTER else before
+        return _project(document, projection) if document is not None else None
+
+    async def find_one_and_delete(
+        self, filter, projection=None, sort=None, session=None, **kwargs
+    ):
+        deleted = self._delete(filter, sort=sort)
+        return _project(deleted[0], projection) if deleted else None
+
+    async def delete_one(self, filter, session=None, **kwargs):
+        return DeleteResult({"n": len(self._delete(filter))}, True)
+
+    async def delete_many(self, filter, session=None, **kwargs):
+        return DeleteResult({"n": len(self._delete(filter, many=True))}, True)
+
+    async def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        result = {
+            "writeErrors": [],
+            "writeConcernErrors": [],
+            "nInserted": 0,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+        }
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result["nInserted"] += 1
+                    continue
+                if isinstance(request, (DeleteOne, DeleteMany)):
+                    deleted = self._delete(
+                        request._filter, many=isinstance(request, DeleteMany)
+                    )
+                    result["nRemoved"] += len(deleted)
+                    continue
+                if not isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    raise TypeError(f"{request!r} is not a valid request")
+                changes, upserted_id = self._update(
+                    request._filter,
+                    request._doc,
+                    bool(request._upsert),
+                    many=isinstance(request, UpdateMany),
+                )
+                if upserted_id is not None:
+                    result["nUpserted"] += 1
+                    result["upserted"].append({"index": i, "_id": upserted_id})
+                else:
+                    raw = self._update_result(changes, None).raw_result
+                    result["nMatched"] += raw["n"]
+                    result["nModified"] += raw["nModified"]
+            except DuplicateKeyError as error:
+                result["writeErrors"].append(
+                    {"index": i, "code": 11000, "errmsg": str(error)}
+                )
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def aggregate(self, pipeline: list, session=None, **kwargs):
+        # A leading $match can use the indexes; stages never modify their
+        # input, so only the results are copied
+        query = pipeline[0]["$match"] if pipeline and "$match" in pipeline[0] else {}
+        documents, _ = self._find(query)
+        results = _aggregate(documents, pipeline[1:] if query else pipeline)
+        return MemoryCommandCursor([_copy(d) for d in results])
+
+    async def create_indexes(self, indexes: list, session=None, **kwargs):
+        names = []
+        for model in indexes:
+            document = model.document
+            keys = list(document["key"].items())
+            name = document["name"]
+            if any(direction == "text" for _, direction in keys):
+                weights = document.get("weights", {})
+                self.text_index = _TextIndex(
+                    name, {f: weights.get(f, 1) for f, d in keys if d == "text"}
+                )
+            elif name not in self.indexes:
+                index = _Index(
+                    name, [f for f, _ in keys], document.get("unique", False)
+                )
+                for existing in self.documents.values():
+                    index.check(existing)
+                    index.add(existing)
+                self.indexes[name] = index
+            names.append(name)
+        return names
+
+    async def index_information(self, session=None) -> dict:
+        information = {"_id_": {"key": [("_id", 1)]}}
+        for name, index in self.indexes.items():
+            information[name] = {"key": [(f, 1) for f in index.fields]}
+            if index.unique:
+                information[name]["unique"] = True
+        if self.text_index:
+            information[self.text_index.name] = {
+                "key": [("_fts", "text"), ("_ftsx", 1)],
+                "weights": self.text_index.weights,
+            }
+        return information
+
+    async def create_index(self, keys, session=None, **kwargs):
+        return (await self.create_indexes([IndexModel(keys, **kwargs)]))[0]
+
+    async def drop(self, session=None):
+        self.documents.clear()
+        self.indexes.clear()
+        self.text_index = None
+
+    def explain(self, query: dict) -> dict:
+        if "$text" in query:
+            stage = {
+                "stage": "TEXT",
+                "indexName": getattr(self.text_index, "name", None),
+            }
+        else:
+            name, _ = self._plan(query)
+            stage = (
+                {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}
+                if name
+                else {"stage": "COLLSCAN"}
+            )
+        return {"queryPlanner": {"winningPlan": stage}, "ok": 1.0}
+
+
+class MemoryDatabase:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self.collections = {}
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(self, name)
+        return self.collections[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    async def list_collection_names(self, **kwargs):
+        return list(self.collections)
+
+    async def command(self, command, **kwargs):
+        if isinstance(command, str):
+            command = {command: 1}
+        if "ping" in command:
+            return {"ok": 1.0}
+        if "explain" in command and "find" in command["explain"]:
+            explained = command["explain"]
+            return self.get_collection(explained["find"]).explain(
+                explained.get("filter", {})
+            )
+        raise OperationFailure(f"Unsupported command: {next(iter(command))}")
+
+
+class MemoryClient:
+    def __init__(self):
+        self.databases = {}
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        # One copy of the data, so read preferences don't apply
+        if name not in self.databases:
+            self.databases[name] = MemoryDatabase(self, name)
+        return self.databases[name]
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        return self.get_database(name)
+
+    def close(self):
+        pass
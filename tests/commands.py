@@ -0,0 +1,93 @@
+import contextlib
+import functools
+import inspect
+
+from pymongo import monitoring
+
+from src.storage.memory import MemoryCollection
+
+# MemoryCollection method -> the command a Motor collection sends for it
+MEMORY_COMMANDS = {
+    "find": "find",
+    "find_one": "find",
+    "count_documents": "aggregate",
+    "estimated_document_count": "count",
+    "insert_one": "insert",
+    "insert_many": "insert",
+    "update_one": "update",
+    "update_many": "update",
+    "replace_one": "update",
+    "find_one_and_update": "findAndModify",
+    "find_one_and_delete": "findAndModify",
+    "delete_one": "delete",
+    "delete_many": "delete",
+    "bulk_write": "bulkWrite",
+    "aggregate": "aggregate",
+    "create_indexes": "createIndexes",
+}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    # Collects (command, collection) pairs sent while record() is open; registered
+    # on a real client, or fed by the MemoryCollection wrappers below
+    def __init__(self):
+        self.commands = None
+
+    @contextlib.contextmanager
+    def record(self):
+        self.commands = []
+        try:
+            yield self.commands
+        finally:
+            self.commands = None
+
+    def add(self, command: str, collection: str):
+        if self.commands is not None:
+            self.commands.append((command, collection))
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self.add(event.command_name, collection if isinstance(collection, str) else "")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def record_memory_commands(monkeypatch, recorder: CommandRecorder):
+    # find_one calls find, so only the outermost call counts
+    depth = [0]
+
+    def wrap(method, command):
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                if depth[0] == 0:
+                    recorder.add(command, self.name)
+                depth[0] += 1
+                try:
+                    return await method(self, *args, **kwargs)
+                finally:
+                    depth[0] -= 1
+
+        else:
+
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                if depth[0] == 0:
+                    recorder.add(command, self.name)
+                depth[0] += 1
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    depth[0] -= 1
+
+        return wrapper
+
+    for name, command in MEMORY_COMMANDS.items():
+        monkeypatch.setattr(
+            MemoryCollection, name, wrap(getattr(MemoryCollection, name), command)
+        )
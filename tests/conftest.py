@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("MONGO_DB_NAME", "library_test")
+os.environ.setdefault("ADMIN_USERNAME", "admin")
+os.environ.setdefault("ADMIN_PASSWORD", "admin1234")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("OVERDUE_SWEEP_INTERVAL", "0")
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from src.cache import TTLCache  # noqa: E402
+from src.indexes import ensure_indexes  # noqa: E402
+from src.storage.memory import MemoryClient  # noqa: E402
+from tests.commands import CommandRecorder  # noqa: E402
+from tests.commands import record_memory_commands  # noqa: E402
+
+# "memory" (src.storage.memory) or "mongo", a real server at TEST_MONGO_URI whose
+# MONGO_DB_NAME database is dropped before every test
+TEST_STORAGE = os.environ.get("TEST_STORAGE", "memory")
+TEST_MONGO_URI = os.environ.get("TEST_MONGO_URI", "mongodb://localhost:27017")
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def run(event_loop):
+    def run(coroutine):
+        return event_loop.run_until_complete(coroutine)
+
+    return run
+
+
+@pytest.fixture(scope="session")
+def recorder():
+    return CommandRecorder()
+
+
+@pytest.fixture(scope="session")
+def mongo_client(recorder):
+    if TEST_STORAGE != "mongo":
+        yield None
+        return
+    client = AsyncIOMotorClient(TEST_MONGO_URI, event_listeners=[recorder])
+    yield client
+    client.close()
+
+
+@pytest.fixture(autouse=True)
+def no_caches(monkeypatch):
+    # Every test gets a fresh database, the process caches would outlive it
+    for module, name in [
+        ("src.crud.book", "book_cache"),
+        ("src.crud.book", "book_title_cache"),
+        ("src.crud.catalog", "catalog_version_cache"),
+        ("src.crud.user", "user_cache"),
+        ("src.crud.stats", "stats_cache"),
+    ]:
+        monkeypatch.setattr(f"{module}.{name}", TTLCache(1, 0, False))
+
+
+@pytest.fixture
+def db(run, mongo_client, recorder, monkeypatch):
+    name = os.environ["MONGO_DB_NAME"]
+    if mongo_client is not None:
+        run(mongo_client.drop_database(name))
+        database = mongo_client[name]
+    else:
+        record_memory_commands(monkeypatch, recorder)
+        database = MemoryClient()[name]
+    run(ensure_indexes(database))
+    return database
@@ -0,0 +1,209 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from src.auth import password_hasher
+from src.cache import TTLCache
+from src.crud.catalog import bump_catalog_version, catalog_changes
+from src.database import get_database
+
+# The whole app on the memory backend (STORAGE_BACKEND in conftest.py); every
+# client starts a new in-process database through the lifespan
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # The lifespan shuts the bcrypt threads down, but every test starts the app
+    monkeypatch.setattr(password_hasher, "shutdown", lambda: None)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def log_in(client, username: str, password: str) -> dict:
+    response = client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def admin(client):
+    return log_in(client, os.environ["ADMIN_USERNAME"], os.environ["ADMIN_PASSWORD"])
+
+
+@pytest.fixture
+def member(client, admin):
+    response = client.post(
+        "/user/",
+        json={"username": "bob", "password": "bob12345", "role": "MEMBER"},
+        headers=admin,
+    )
+    assert response.status_code == 201, response.text
+    return log_in(client, "bob", "bob12345")
+
+
+def add_books(client, admin, titles: list):
+    for title in titles:
+        response = client.post(
+            "/book/",
+            json={
+                "title": title,
+                "author": "Frank Herbert",
+                "category": "Science Fiction",
+                "total_count": 2,
+                "available_count": 2,
+            },
+            headers=admin,
+        )
+        assert response.status_code == 200, response.text
+
+
+def test_users(client, admin, member):
+    duplicate = client.post(
+        "/user/",
+        json={"username": "bob", "password": "bob12345", "role": "MEMBER"},
+        headers=admin,
+    )
+    assert duplicate.status_code == 400
+
+    users = client.get("/user/list", headers=admin).json()
+    assert sorted(user["username"] for user in users) == ["admin", "bob"]
+    assert all("password" not in user for user in users)
+    assert client.get("/user/list", headers=member).status_code == 403
+    assert client.post("/token", data={"username": "bob", "password": "no"}).is_error
+
+
+def test_book_pages_and_search(client, admin):
+    add_books(client, admin, ["Dune", "Dune Messiah", "Children of Dune", "Emma"])
+    duplicate = client.post(
+        "/book/",
+        json={"title": "Dune", "author": "Frank Herbert", "category": "Science"},
+        headers=admin,
+    )
+    assert duplicate.status_code == 400
+
+    first = client.get("/book/list", params={"limit": 3})
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get("/book/list", params={"limit": 3, "cursor": cursor})
+    titles = [book["title"] for book in first.json() + second.json()]
+    assert titles == ["Dune", "Dune Messiah", "Children of Dune", "Emma"]
+    assert "X-Next-Cursor" not in second.headers
+
+    found = client.get("/book/search", params={"title": "messiah"}).json()
+    assert [book["title"] for book in found] == ["Dune Messiah"]
+    ranked = client.get("/book/search", params={"q": "dune"}).json()
+    assert [book["title"] for book in ranked][0] == "Dune"
+    assert "Emma" not in [book["title"] for book in ranked]
+
+
+def test_catalog_etag(client, admin):
+    add_books(client, admin, ["Dune"])
+    client.portal.call(catalog_changes.flush)
+
+    first = client.get("/book/list")
+    etag = first.headers["ETag"]
+    again = client.get("/book/list", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    add_books(client, admin, ["Emma"])
+    client.portal.call(catalog_changes.flush)
+    changed = client.get("/book/list", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == 2
+
+
+def book_available(client, title: str) -> int:
+    [book] = client.get("/book/search", params={"title": f"^{title}$"}).json()
+    return book["available_count"]
+
+
+def test_loan_lifecycle(client, admin, member):
+    add_books(client, admin, ["Dune"])
+    loan = {"username": "bob", "book_title": "Dune", "status": "PENDING"}
+    created = client.post("/loan/", json=loan, headers=member)
+    assert created.status_code == 200, created.text
+    loan_id = created.json()["_id"]
+    assert client.post("/loan/", json=loan, headers=member).status_code == 400
+
+    approved = client.put(f"/loan/approve/{loan_id}", headers=admin)
+    assert approved.json()["status"] == "APPROVED"
+    assert book_available(client, "Dune") == 1
+    [my_loan] = client.get("/loan/my_loans", headers=member).json()
+    assert my_loan["status"] == "APPROVED" and my_loan["overdue"] is False
+
+    renewal = client.post("/loan_renewal/", json={"loan_id": loan_id}, headers=member)
+    assert renewal.json()["status"] == "PENDING"
+    again = client.post("/loan_renewal/", json={"loan_id": loan_id}, headers=member)
+    assert again.status_code == 400
+    renewal_id = renewal.json()["_id"]
+    client.post(f"/loan_renewal/approve/{renewal_id}", headers=admin)
+    renewed = client.get(f"/loan/id/{loan_id}", headers=admin).json()
+    assert renewed["status"] == "APPROVED"
+    assert renewed["return_date"] > approved.json()["return_date"]
+
+    returned = client.post("/loan_return/", json={"loan_id": loan_id}, headers=member)
+    assert returned.json()["status"] == "PENDING"
+    again = client.post("/loan_return/", json={"loan_id": loan_id}, headers=member)
+    assert again.status_code == 400
+    client.post(f"/loan_return/approve/{returned.json()['_id']}", headers=admin)
+    assert book_available(client, "Dune") == 2
+    assert client.get("/loan/my_loans", headers=member).json() == []
+    [history] = client.get(
+        "/loan/my_loans", params={"history": True}, headers=member
+    ).json()
+    assert history["status"] == "RETURNED"
+
+    stats = client.get("/stats/circulation", headers=admin).json()
+    assert stats["loans"]["RETURNED"] == 1
+    assert stats["returns"]["APPROVED"] == stats["renewals"]["APPROVED"] == 1
+
+
+def test_members_cannot_approve(client, admin, member):
+    add_books(client, admin, ["Dune"])
+    loan = {"username": "bob", "book_title": "Dune", "status": "PENDING"}
+    loan_id = client.post("/loan/", json=loan, headers=member).json()["_id"]
+    assert client.put(f"/loan/approve/{loan_id}", headers=member).status_code == 403
+    assert client.get("/loan/list", headers=member).status_code == 403
+
+
+def test_cached_book_follows_the_catalog_etag(client, admin, monkeypatch):
+    monkeypatch.setattr("src.crud.book.book_cache", TTLCache(16, 60))
+    add_books(client, admin, ["Dune"])
+    client.portal.call(catalog_changes.flush)
+    [book] = client.get("/book/list").json()
+    first = client.get(f"/book/book/{book['_id']}")
+    assert first.json()["category"] == "Science Fiction"
+
+    async def write_elsewhere():
+        # Another worker's update: this process's book cache never hears of it
+        db = await get_database()
+        await db.books.update_one({"title": "Dune"}, {"$set": {"category": "SF"}})
+        await bump_catalog_version(db)
+
+    client.portal.call(write_elsewhere)
+    second = client.get(
+        f"/book/book/{book['_id']}", headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["category"] == "SF"
+
+
+def test_current_loans_are_paged(client, admin, member):
+    add_books(client, admin, ["Dune", "Emma", "Persuasion"])
+    for title in ["Dune", "Emma", "Persuasion"]:
+        loan = {"username": "bob", "book_title": title, "status": "PENDING"}
+        client.post("/loan/", json=loan, headers=member)
+
+    first = client.get("/loan/my_loans", params={"limit": 2}, headers=member)
+    assert [loan["book_title"] for loan in first.json()] == ["Dune", "Emma"]
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(
+        "/loan/my_loans", params={"limit": 2, "cursor": cursor}, headers=member
+    )
+    assert [loan["book_title"] for loan in second.json()] == ["Persuasion"]
+    assert "X-Next-Cursor" not in second.headers
+    skipped = client.get("/loan/my_loans", params={"skip": 1}, headers=member)
+    assert [loan["book_title"] for loan in skipped.json()] == ["Emma", "Persuasion"]
@@ -0,0 +1,330 @@
+import os
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from src.crud import book, loan, loan_summary, stats, user
+from src.crud.catalog import catalog_changes
+from src.indexes import ensure_indexes
+from src.models.loan import LoanStatus
+from src.storage.memory import MemoryClient
+
+# The memory engine against a reference: mongomock, or the TEST_STORAGE=mongo
+# server. What mongomock can't run ($text, update pipelines, mixed type
+# accumulators) is compared with the server only, and pinned to the server's
+# documented results on the memory engine.
+
+BOOK_IDS = [ObjectId(f"{i:024x}") for i in range(1, 5)]
+LOAN_IDS = [ObjectId(f"{i:024x}") for i in range(101, 105)]
+# BSON dates keep milliseconds
+DATE = datetime(2024, 5, 1, 12, 30, 15, 250000)
+RETURN_DATE = datetime(2024, 5, 15, 12, 30, 15, 250000)
+
+BOOKS = [
+    ("Dune", "Frank Herbert", "Science Fiction", 2),
+    ("Dune Messiah", "Frank Herbert", "Science Fiction", 0),
+    ("Emma", "Jane Austen", "Novel", 1),
+    ("Persuasion", "Jane Austen", "Novel", 3),
+]
+LOANS = [
+    ("bob", "Dune", LoanStatus.APPROVED),
+    ("bob", "Emma", LoanStatus.PENDING),
+    ("eve", "Dune", LoanStatus.RENEW_PENDING),
+    ("eve", "Persuasion", LoanStatus.RETURNED),
+]
+
+
+async def seed(db):
+    await db.books.insert_many(
+        [
+            {
+                "_id": id,
+                "title": title,
+                "author": author,
+                "category": category,
+                "total_count": 3,
+                "available_count": available,
+            }
+            for id, (title, author, category, available) in zip(BOOK_IDS, BOOKS)
+        ]
+    )
+    await db.users.insert_many(
+        [
+            {"username": name, "role": "MEMBER", "password": "x", "created_at": DATE}
+            for name in ("bob", "eve")
+        ]
+    )
+    await db.loans.insert_many(
+        [
+            {
+                "_id": id,
+                "username": username,
+                "book_title": title,
+                "status": status.value,
+                "date": DATE,
+                "return_date": RETURN_DATE,
+            }
+            for id, (username, title, status) in zip(LOAN_IDS, LOANS)
+        ]
+    )
+
+
+def normalize(value, dropped: tuple = ()):
+    # Ids inserted by either backend are new ObjectIds, compare their type only
+    if isinstance(value, dict):
+        return {
+            k: normalize(v, dropped)
+            for k, v in value.items()
+            if k not in dropped and not (k == "_id" and v not in BOOK_IDS + LOAN_IDS)
+        }
+    if isinstance(value, list):
+        return [normalize(v, dropped) for v in value]
+    return value
+
+
+@pytest.fixture
+def backends(run, mongo_client):
+    name = os.environ["MONGO_DB_NAME"]
+    memory = MemoryClient()[name]
+    run(ensure_indexes(memory))
+    if mongo_client is None:
+        reference = AsyncMongoMockClient()[name]
+    else:
+        run(mongo_client.drop_database(name))
+        reference = mongo_client[name]
+        run(ensure_indexes(reference))
+    return memory, reference
+
+
+@pytest.fixture
+def server(mongo_client):
+    if mongo_client is None:
+        pytest.skip("mongomock can't run this, set TEST_STORAGE=mongo")
+
+
+# name -> (db -> coroutine, fields set from the clock)
+CASES = {
+    "get_books": (lambda db: book.get_books(db, 1, 2), ()),
+    "get_books_after": (lambda db: book.get_books(db, 0, 10, BOOK_IDS[1]), ()),
+    "get_books_projection": (
+        lambda db: book.get_books(db, 0, 10, projection={"title": 1}),
+        (),
+    ),
+    "search_book": (
+        lambda db: book.search_book(db, 0, 10, title="dune", category="^nov"),
+        (),
+    ),
+    "get_book_by_title": (lambda db: book.get_book_by_title("Emma", db), ()),
+    "checkout_book": (lambda db: book.checkout_book("Dune", db), ()),
+    "checkout_book_unavailable": (
+        lambda db: book.checkout_book("Dune Messiah", db),
+        (),
+    ),
+    "checkin_book": (lambda db: book.checkin_book("Emma", db), ()),
+    "get_users": (lambda db: user.get_users(db, 0, 10), ()),
+    "get_loans": (lambda db: loan.get_loans(db, 0, 10, LoanStatus.APPROVED), ()),
+    "get_user_loans": (lambda db: loan.get_user_loans(db, "eve", 0, 1), ()),
+    "get_book_loans": (lambda db: loan.get_book_loans(db, "Dune", 0, 10), ()),
+    "existing_loan": (lambda db: loan.existing_loan("bob", "Emma", db), ()),
+    "approve_loan": (
+        lambda db: loan.approve_loan(str(LOAN_IDS[1]), db),
+        ("date", "return_date"),
+    ),
+    "return_loan": (lambda db: loan.return_loan(str(LOAN_IDS[2]), db), ()),
+    "return_loan_returned": (lambda db: loan.return_loan(str(LOAN_IDS[3]), db), ()),
+    "request_loan_renewal": (
+        lambda db: loan.request_loan_renewal(str(LOAN_IDS[0]), "bob", db),
+        (),
+    ),
+    "rebuild_loan_summary": (
+        lambda db: loan_summary.rebuild_loan_summary("eve", db),
+        ("rebuilt_at",),
+    ),
+    "compute_circulation_stats": (
+        lambda db: stats.compute_circulation_stats(db),
+        ("generated_at",),
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_crud_parity(run, backends, name):
+    call, dropped = CASES[name]
+
+    async def results():
+        answers = []
+        for db in backends:
+            await seed(db)
+            answers.append(normalize(await call(db), dropped))
+            await catalog_changes.flush()
+        return answers
+
+    memory, reference = run(results())
+    assert memory == reference
+
+
+def test_renew_loan_parity(run, backends, server):
+    async def results():
+        answers = []
+        for db in backends:
+            await seed(db)
+            answers.append(await loan.renew_loan(str(LOAN_IDS[2]), db))
+        return answers
+
+    memory, reference = run(results())
+    assert memory == reference
+
+
+# One value of each BSON type the app stores, in the server's ascending order;
+# an array sorts as its smallest element ascending and its largest descending
+ASCENDING = [
+    [],
+    None,
+    1,
+    [2, 7],
+    2.5,
+    3,
+    ["b", 5],
+    "a",
+    "c",
+    {"x": 1},
+    ObjectId("0" * 24),
+    False,
+    True,
+    DATE,
+]
+DESCENDING = [
+    DATE,
+    True,
+    False,
+    ObjectId("0" * 24),
+    {"x": 1},
+    "c",
+    ["b", 5],
+    "a",
+    [2, 7],
+    3,
+    2.5,
+    1,
+    None,
+    [],
+]
+
+
+async def sort_values(db, direction: int, values: list = ASCENDING) -> list:
+    await db.values.insert_many([{"v": v} for v in reversed(values)])
+    documents = db.values.find({}, {"_id": 0}).sort("v", direction)
+    return [d["v"] for d in await documents.to_list(length=None)]
+
+
+@pytest.mark.parametrize("direction, expected", [(1, ASCENDING), (-1, DESCENDING)])
+def test_sort_type_brackets(run, backends, direction, expected):
+    memory, _ = backends
+    assert run(sort_values(memory, direction)) == expected
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_sort_type_brackets_parity(run, backends, direction):
+    # mongomock orders an array by its first element in both directions
+    memory, reference = backends
+    scalars = [v for v in ASCENDING if not isinstance(v, list)]
+    assert run(sort_values(memory, direction, scalars)) == run(
+        sort_values(reference, direction, scalars)
+    )
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_sort_type_brackets_server(run, backends, server, direction):
+    memory, reference = backends
+    assert run(sort_values(memory, direction)) == run(sort_values(reference, direction))
+
+
+GROUP = {
+    "_id": "$g",
+    "count": {"$sum": 1},
+    "sum": {"$sum": "$v"},
+    "avg": {"$avg": "$v"},
+    "min": {"$min": "$v"},
+    "max": {"$max": "$v"},
+    "first": {"$first": "$v"},
+    "last": {"$last": "$v"},
+}
+
+
+async def group(db, values: list) -> list:
+    documents = [{"g": "g", "v": v} for v in values]
+    # Not last: mongomock's $first/$last skip a missing field, the server's don't
+    documents.insert(len(documents) // 2, {"g": "g"})
+    await db.values.insert_many(documents + [{"g": "h", "v": 1}])
+    groups = await db.values.aggregate(
+        [{"$group": GROUP}, {"$sort": {"_id": 1}}]
+    ).to_list(length=None)
+    return groups
+
+
+def test_group_accumulators(run, backends):
+    memory, reference = backends
+    values = [4, 2.5, None, 1]
+    assert run(group(memory, values)) == run(group(reference, values))
+
+
+def test_group_accumulators_mixed_types(run, backends):
+    memory, _ = backends
+    # Sums and averages skip everything that is not a number, $min and $max
+    # skip null and missing and compare the rest in sort order
+    [g, h] = run(group(memory, [3, "a", True, None, 2.5, DATE, [1]]))
+    assert g == {
+        "_id": "g",
+        "count": 8,
+        "sum": 5.5,
+        "avg": 2.75,
+        "min": 2.5,
+        "max": DATE,
+        "first": 3,
+        "last": [1],
+    }
+    assert h["sum"] == h["avg"] == h["min"] == h["max"] == 1
+
+
+def test_group_accumulators_mixed_types_server(run, backends, server):
+    memory, reference = backends
+    values = [3, "a", True, None, 2.5, DATE, [1]]
+    assert run(group(memory, values)) == run(group(reference, values))
+
+
+async def ranked(db, query: str) -> list:
+    await seed(db)
+    await db.books.insert_one(
+        {"title": "Dune Dune Dune", "author": "Anon", "category": "Parody"}
+    )
+    books = await book.search_book_ranked(db, query, 0, 10, {"title": 1, "_id": 0})
+    return [(b["title"], round(b["score"], 6)) for b in books]
+
+
+# title weight 10, author 5, category 1. A field that is exactly the term gets
+# 1.1, each repeat half the one before, and a term in a longer field less
+TEXT_SCORES = {
+    "dune": [("Dune Dune Dune", 17.5), ("Dune", 11.0), ("Dune Messiah", 7.5)],
+    "herbert persuasion": [
+        ("Persuasion", 11.0),
+        ("Dune", 3.75),
+        ("Dune Messiah", 3.75),
+    ],
+}
+
+
+@pytest.mark.parametrize("query", TEXT_SCORES)
+def test_text_score(run, backends, query):
+    memory, _ = backends
+    assert sorted(run(ranked(memory, query)), key=lambda b: -b[1]) == (
+        TEXT_SCORES[query]
+    )
+
+
+@pytest.mark.parametrize("query", ["dune", "jane herbert", "novel persuasion"])
+def test_text_score_server(run, backends, server, query):
+    # Words that are their own stem and no stop words: the engine has neither
+    memory, reference = backends
+    assert sorted(run(ranked(memory, query))) == sorted(run(ranked(reference, query)))
@@ -0,0 +1,31 @@
+import io
+
+import pytest
+
+from src.book_import import MissingUniqueIndex, import_books
+from src.indexes import ensure_indexes
+from src.models.book import BookImportFormat
+from src.storage.memory import MemoryClient
+
+CSV = """title,author,category,total_count,available_count
+Dune,Frank Herbert,SF,2,2
+Emma,Jane Austen,Novel,1,1
+Dune,Frank Herbert,SF,1,1
+"""
+
+
+def test_duplicates_are_rejected_by_the_unique_index(run, db):
+    report = run(import_books(io.StringIO(CSV), BookImportFormat.CSV, db))
+    assert report["inserted"] == 2
+    assert [error["row"] for error in report["errors"]] == [3]
+
+
+def test_import_refuses_to_run_without_the_unique_index(run):
+    db = MemoryClient()["library_duplicates"]
+    book = {"title": "Dune", "author": "Frank Herbert", "category": "SF"}
+    run(db.books.insert_many([dict(book), dict(book)]))
+    assert run(ensure_indexes(db)) == ["books.title_author"]
+
+    with pytest.raises(MissingUniqueIndex):
+        run(import_books(io.StringIO(CSV), BookImportFormat.CSV, db))
+    assert run(db.books.count_documents({})) == 2
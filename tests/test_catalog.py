@@ -0,0 +1,40 @@
+import pytest
+from pymongo.errors import AutoReconnect
+
+from src.crud import catalog
+
+
+@pytest.fixture
+def changes(monkeypatch):
+    changes = catalog.CatalogChanges()
+    monkeypatch.setattr(catalog, "catalog_changes", changes)
+    monkeypatch.setattr(catalog, "catalog_version_cache", catalog.TTLCache(1, 60))
+    monkeypatch.setattr(catalog, "CATALOG_BUMP_RETRY", 0)
+    return changes
+
+
+def test_failed_bump_is_retried_and_never_cached(run, db, changes, monkeypatch):
+    bump = catalog.bump_catalog_version
+    failures = []
+    versions = []
+
+    async def flaky_bump(db):
+        if len(failures) < 2:
+            failures.append(1)
+            # What a request sees while the bump keeps failing
+            versions.append((changes.pending, await catalog.get_catalog_version(db)))
+            raise AutoReconnect("primary stepped down")
+        return await bump(db)
+
+    monkeypatch.setattr(catalog, "bump_catalog_version", flaky_bump)
+
+    async def change():
+        changes.mark(db)
+        await changes.flush()
+        return await catalog.get_catalog_version(db)
+
+    version = run(change())
+    assert len(failures) == 2
+    assert all(pending for pending, _ in versions)
+    assert version["version"] == 1
+    assert catalog.catalog_version_cache.get(catalog.CATALOG_VERSION_ID) == version
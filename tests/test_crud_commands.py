@@ -0,0 +1,133 @@
+import pytest
+from bson import ObjectId
+
+from src.crud import book, loan, loan_renewal, loan_return, user
+from src.models.book import BookCreate, BookUpdate
+from src.models.loan import LoanCreate, LoanStatus, LoanUpdate
+from src.models.loan_renewal import LoanRenewalCreate
+from src.models.loan_return import LibrarianStatus, LoanReturnCreate
+from src.models.user import UserCreate, UserUpdate
+
+
+async def seed(db) -> dict:
+    ids = {
+        "book": ObjectId(),
+        "user": ObjectId(),
+        "loan": ObjectId(),
+        "loan_return": ObjectId(),
+        "loan_renewal": ObjectId(),
+    }
+    await db.books.insert_one(
+        {
+            "_id": ids["book"],
+            "title": "Dune",
+            "author": "Herbert",
+            "category": "SF",
+            "total_count": 2,
+            "available_count": 2,
+        }
+    )
+    await db.users.insert_one(
+        {"_id": ids["user"], "username": "bob", "role": "MEMBER", "password": "x"}
+    )
+    await db.loans.insert_one(
+        {
+            "_id": ids["loan"],
+            "username": "bob",
+            "book_title": "Dune",
+            "status": "PENDING",
+        }
+    )
+    for name, collection in [
+        ("loan_return", "loan_returns"),
+        ("loan_renewal", "loan_renewals"),
+    ]:
+        await db[collection].insert_one(
+            {"_id": ids[name], "loan_id": str(ids["loan"]), "status": "PENDING"}
+        )
+    return {name: str(id) for name, id in ids.items()}
+
+
+# function -> (ids -> coroutine, the one command it may send)
+CASES = {
+    "create_book": (
+        lambda db, ids: book.create_book(
+            BookCreate(title="Emma", author="Austen", category="Novel"), db
+        ),
+        "insert",
+    ),
+    "update_book": (
+        lambda db, ids: book.update_book(ids["book"], BookUpdate(category="X"), db),
+        "findAndModify",
+    ),
+    "create_user": (
+        lambda db, ids: user.create_user(
+            UserCreate(username="alice", password="alice1234", role="MEMBER"),
+            "not-a-hash",
+            db,
+        ),
+        "insert",
+    ),
+    "update_user": (
+        lambda db, ids: user.update_user(ids["user"], UserUpdate(full_name="B"), db),
+        "findAndModify",
+    ),
+    "update_user_password": (
+        lambda db, ids: user.update_user_password("bob", "not-a-hash", db),
+        "update",
+    ),
+    "create_loan": (
+        lambda db, ids: loan.create_loan(
+            LoanCreate(username="bob", book_title="Emma", status="PENDING"), db
+        ),
+        "insert",
+    ),
+    "update_loan": (
+        lambda db, ids: loan.update_loan(
+            ids["loan"], LoanUpdate(status=LoanStatus.APPROVED), db
+        ),
+        "findAndModify",
+    ),
+    "create_loan_return": (
+        lambda db, ids: loan_return.create_loan_return(
+            LoanReturnCreate(loan_id=str(ObjectId())), LibrarianStatus.PENDING, db
+        ),
+        "insert",
+    ),
+    "update_loan_return": (
+        lambda db, ids: loan_return.update_loan_return(
+            db, ids["loan_return"], LibrarianStatus.APPROVED
+        ),
+        "findAndModify",
+    ),
+    "create_loan_renewal": (
+        lambda db, ids: loan_renewal.create_loan_renewal(
+            LoanRenewalCreate(loan_id=str(ObjectId())), LibrarianStatus.PENDING, db
+        ),
+        "insert",
+    ),
+    "update_loan_renewal": (
+        lambda db, ids: loan_renewal.update_loan_renewal(
+            db, ids["loan_renewal"], LibrarianStatus.APPROVED
+        ),
+        "findAndModify",
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_write_sends_one_command(run, db, recorder, name):
+    call, command = CASES[name]
+    ids = run(seed(db))
+
+    async def write():
+        # Stops before anything the write scheduled in the background, such as
+        # the catalog version bump, gets to run
+        with recorder.record() as commands:
+            result = await call(db, ids)
+        return result, commands
+
+    result, commands = run(write())
+    # update_user_password returns nothing, the others the written document
+    assert result is not None or name == "update_user_password"
+    assert [c for c, _ in commands] == [command]
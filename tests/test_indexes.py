@@ -0,0 +1,19 @@
+from src.indexes import INDEXES, ensure_indexes
+from src.storage.memory import MemoryClient
+
+
+def test_duplicates_only_fail_their_unique_index(run):
+    # The db fixture already has the indexes, this one starts from existing data
+    db = MemoryClient()["library_duplicates"]
+    book = {"title": "Dune", "author": "Herbert", "category": "SF"}
+    run(db.books.insert_many([dict(book), dict(book)]))
+
+    failed = run(ensure_indexes(db))
+
+    assert failed == ["books.title_author"]
+    assert db.books.text_index is not None
+    assert set(db.books.indexes) == {
+        index.document["name"]
+        for index in INDEXES["books"]
+        if index.document["name"] not in ("title_author", "text")
+    }
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from src.crud.catalog import catalog_changes
+from src.models.loan_renewal import LoanRenewalCreate
+from src.models.loan_return import LoanReturnCreate
+from src.routes.loan_renewal import (loan_renewal_approve_route,
+                                     loan_renewal_create_route)
+from src.routes.loan_return import (loan_return_approve_route,
+                                    loan_return_create_route)
+
+MEMBER = {"sub": "bob", "role": "MEMBER"}
+LIBRARIAN = {"sub": "admin", "role": "LIBRARIAN"}
+
+
+async def seed(db) -> str:
+    loan_id = ObjectId()
+    await db.books.insert_one(
+        {
+            "title": "Dune",
+            "author": "Herbert",
+            "category": "SF",
+            "total_count": 1,
+            "available_count": 0,
+        }
+    )
+    loan = {
+        "_id": loan_id,
+        "username": "bob",
+        "book_title": "Dune",
+        "status": "APPROVED",
+        "date": datetime.now(),
+        "return_date": datetime.now() + timedelta(days=14),
+    }
+    await db.loans.insert_one(loan)
+    await db.user_loan_summary.insert_one(
+        {
+            "_id": "bob",
+            "loans": [{k: loan[k] for k in ("_id", "book_title", "status")}],
+            "titles": ["Dune"],
+            "version": 0,
+            "complete": True,
+        }
+    )
+    return str(loan_id)
+
+
+def test_return_flow_commands(run, db, recorder):
+    async def flow():
+        loan_id = await seed(db)
+        with recorder.record() as request:
+            loan_return = await loan_return_create_route(
+                LoanReturnCreate(loan_id=loan_id), user_data=MEMBER, db=db
+            )
+        with recorder.record() as approval:
+            await loan_return_approve_route(
+                loan_return["_id"], user_data=LIBRARIAN, db=db
+            )
+        await catalog_changes.flush()
+        return request, approval, await db.books.find_one({"title": "Dune"})
+
+    request, approval, book = run(flow())
+    assert request == [
+        ("findAndModify", "loans"),
+        ("update", "user_loan_summary"),
+        ("insert", "loan_returns"),
+    ]
+    # The request stores the book title, so approval never reads the loan
+    assert approval == [
+        ("findAndModify", "loan_returns"),
+        ("findAndModify", "books"),
+    ]
+    assert book["available_count"] == 1
+
+
+def test_renewal_flow_commands(run, db, recorder):
+    async def flow():
+        loan_id = await seed(db)
+        with recorder.record() as request:
+            loan_renewal = await loan_renewal_create_route(
+                LoanRenewalCreate(loan_id=loan_id), user_data=MEMBER, db=db
+            )
+        with recorder.record() as approval:
+            await loan_renewal_approve_route(
+                loan_renewal["_id"], user_data=LIBRARIAN, db=db
+            )
+        return request, approval, await db.loans.find_one({"_id": ObjectId(loan_id)})
+
+    request, approval, loan = run(flow())
+    assert request == [
+        ("insert", "loan_renewals"),
+        ("update", "loans"),
+        ("update", "user_loan_summary"),
+    ]
+    # return_date is extended server side, so approval never reads the loan
+    assert approval == [
+        ("findAndModify", "loan_renewals"),
+        ("findAndModify", "loans"),
+        ("update", "user_loan_summary"),
+    ]
+    assert loan["status"] == "APPROVED"
+    assert loan["return_date"] > datetime.now() + timedelta(days=14)
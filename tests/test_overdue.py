@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from src import overdue
+from src.crud.loan import return_loan
+
+
+def test_sweep_flags_and_return_clears_overdue(run, db):
+    loan_id = ObjectId()
+    run(
+        db.loans.insert_one(
+            {
+                "_id": loan_id,
+                "username": "bob",
+                "book_title": "Dune",
+                "status": "APPROVED",
+                "return_date": datetime.now() - timedelta(days=1),
+            }
+        )
+    )
+
+    report = run(overdue.sweep_overdue_loans(db))
+    assert report["flagged"] == 1
+    assert run(db.loans.find_one({"_id": loan_id}))["overdue"] is True
+
+    run(return_loan(str(loan_id), db))
+    loan = run(db.loans.find_one({"_id": loan_id}))
+    assert loan["status"] == "RETURNED"
+    assert loan["overdue"] is False
+
+
+def test_sweeper_survives_unexpected_errors(run, db, monkeypatch, caplog):
+    sweeps = []
+
+    async def sweep(db):
+        sweeps.append(1)
+        if len(sweeps) == 1:
+            raise ValueError("not a database error")
+        if len(sweeps) == 3:
+            raise asyncio.CancelledError
+        return {"flagged": 0}
+
+    monkeypatch.setattr(overdue, "sweep_overdue_loans", sweep)
+    with caplog.at_level(logging.ERROR, logger=overdue.__name__):
+        try:
+            run(overdue.run_overdue_sweeper(db, interval=0))
+        except asyncio.CancelledError:
+            pass
+
+    assert len(sweeps) == 3
+    [record] = caplog.records
+    assert record.getMessage() == "Overdue sweep failed"
+    assert record.exc_info[0] is ValueError
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+from src import startup
+
+
+def test_bootstrap_writes_the_version(run, db):
+    assert run(startup.run_startup(db)) == "done"
+    version = run(db.jobs.find_one({"_id": startup.VERSION_ID}))
+    assert version["version"] == startup.STARTUP_VERSION
+    assert run(db.jobs.find_one({"_id": startup.LOCK_ID})) is None
+    assert run(startup.run_startup(db)) == "current"
+
+
+def test_lost_lease_skips_the_version_write(run, db, monkeypatch):
+    ensure_indexes = startup.ensure_indexes
+
+    async def slow_indexes(db):
+        failed = await ensure_indexes(db)
+        # Ran past STARTUP_LOCK_TTL, and another process took the lease over
+        await db.jobs.update_one(
+            {"_id": startup.LOCK_ID},
+            {
+                "$set": {
+                    "owner": "other-host:1",
+                    "expires_at": datetime.now() + timedelta(minutes=1),
+                }
+            },
+        )
+        return failed
+
+    monkeypatch.setattr(startup, "ensure_indexes", slow_indexes)
+    assert run(startup.run_startup(db)) == "lost"
+    assert run(db.jobs.find_one({"_id": startup.VERSION_ID})) is None
+    assert run(db.users.find_one({})) is None
+    # The new owner's lease is left alone
+    lock = run(db.jobs.find_one({"_id": startup.LOCK_ID}))
+    assert lock["owner"] == "other-host:1"